@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ActivityWriter:
+    """Buffers activity documents and writes them with batched insert_many.
+
+    Routes hand events to write(), which only waits when the queue is full
+    (backpressure); a background task flushes whenever `batch_size` events
+    are queued or `flush_interval` seconds have passed since the first one.
+    close() drains whatever is still queued.
+    """
+
+    def __init__(self, collection, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self._collection = collection
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._task = None
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "blocked_writes": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def write(self, doc: dict):
+        if self._queue.full():
+            self._stats["blocked_writes"] += 1
+        await self._queue.put(doc)
+        self._stats["enqueued"] += 1
+
+    async def close(self, timeout: float = 10.0):
+        """Stop the flusher after writing everything queued so far."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Activity writer did not drain within %.0fs; %d events dropped", timeout, self._queue.qsize())
+        self._task = None
+
+    def stats(self) -> dict:
+        flushes = self._stats["flushes"]
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "avg_flush_ms": self._stats["total_flush_ms"] / flushes if flushes else 0.0,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch, deadline, getter = [], None, None
+        while True:
+            # A pending get() survives timeouts, so no event is lost to cancellation
+            if getter is None:
+                getter = asyncio.ensure_future(self._queue.get())
+            timeout = max(deadline - loop.time(), 0) if batch else None
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            if done:
+                doc, getter = getter.result(), None
+                if doc is _STOP:
+                    break
+                if not batch:
+                    deadline = loop.time() + self._flush_interval
+                batch.append(doc)
+                if len(batch) < self._batch_size:
+                    continue
+            await self._flush(batch)
+            batch = []
+
+        # Whatever was queued before (or raced in behind) the stop marker
+        while not self._queue.empty():
+            doc = self._queue.get_nowait()
+            if doc is not _STOP:
+                batch.append(doc)
+        for start in range(0, len(batch), self._batch_size):
+            await self._flush(batch[start:start + self._batch_size])
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            await self._collection.insert_many(batch, ordered=False)
+            self._stats["written"] += len(batch)
+        except Exception:
+            self._stats["failed"] += len(batch)
+            logger.exception("Failed to write %d activity events", len(batch))
+        elapsed = (time.perf_counter() - started) * 1000
+        self._stats["flushes"] += 1
+        self._stats["last_flush_ms"] = elapsed
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed)
+        self._stats["total_flush_ms"] += elapsed
+
+
+# ============ RETENTION ============
+
+async def rollup_activities(db, older_than: datetime) -> int:
+    """Compact raw events before `older_than` into per-user daily summaries.
+
+    Works one UTC day at a time: the day's counts are recomputed in full and
+    written with $set before its raw events are deleted, so a run that dies
+    half-way can simply be repeated. Returns the number of days compacted.
+    """
+    cutoff = older_than.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = 0
+    while True:
+        oldest = await db.activities.find_one(
+            {"timestamp": {"$lt": cutoff}},
+            {"timestamp": 1},
+            sort=[("timestamp", 1)]
+        )
+        if not oldest:
+            return days
+
+        day = oldest["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0)
+        window = {"timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}}
+        groups = await db.activities.aggregate([
+            {"$match": window},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "type": "$type"},
+                "count": {"$sum": 1},
+                "first": {"$min": "$timestamp"},
+                "last": {"$max": "$timestamp"}
+            }}
+        ], allowDiskUse=True).to_list(None)
+
+        summaries = {}
+        for group in groups:
+            summary = summaries.setdefault(group["_id"]["user_id"], {
+                "user_id": group["_id"]["user_id"],
+                "day": day,
+                "counts": {},
+                "total": 0,
+                "first": group["first"],
+                "last": group["last"],
+            })
+            summary["counts"][group["_id"]["type"]] = group["count"]
+            summary["total"] += group["count"]
+            summary["first"] = min(summary["first"], group["first"])
+            summary["last"] = max(summary["last"], group["last"])
+
+        if summaries:
+            await db.activity_rollups.bulk_write([
+                UpdateOne({"user_id": user_id, "day": day}, {"$set": summary}, upsert=True)
+                for user_id, summary in summaries.items()
+            ], ordered=False)
+        await db.activities.delete_many(window)
+        days += 1
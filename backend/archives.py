@@ -0,0 +1,99 @@
+import posixpath
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, Tuple
+
+# ZIP timestamps cannot go back further than this
+ZIP_EPOCH = datetime(1980, 1, 1)
+
+
+class _Sink:
+    """Unseekable file object that collects what zipfile writes until it is drained.
+
+    Without tell()/seek() zipfile streams: entries carry data descriptors
+    after their data instead of sizes patched into the local header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def safe_name(name: str) -> str:
+    """A single path component for an item name."""
+    name = name.replace("/", "_").replace("\\", "_").strip()
+    return name if name not in ("", ".", "..") else "_"
+
+
+class ZipStream:
+    """Builds a ZIP64 archive as a sequence of byte chunks.
+
+    Only the current chunk and zlib's window are held in memory, so the cost
+    of an archive does not grow with its size. The methods block on reads
+    and compression; call them from a worker thread.
+    """
+
+    def __init__(self, compresslevel: int = 6):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", allowZip64=True, compresslevel=compresslevel)
+        self._names = set()
+
+    def unique_name(self, path: str) -> str:
+        """`path`, or "name (n).ext" when an entry of that name is already in the archive."""
+        candidate, counter = path, 1
+        while candidate in self._names:
+            root, ext = posixpath.splitext(path)
+            candidate = f"{root} ({counter}){ext}"
+            counter += 1
+        self._names.add(candidate)
+        return candidate
+
+    def add_directory(self, path: str, modified: datetime) -> Tuple[str, bytes]:
+        """Add an empty directory entry; returns the (possibly renamed) path and its bytes.
+
+        Entries below the directory must be added under the returned path.
+        """
+        path = self.unique_name(path.rstrip("/"))
+        info = self._info(path + "/", modified)
+        info.external_attr = (0o40755 << 16) | 0x10
+        self._zip.writestr(info, b"")
+        return path, self._sink.drain()
+
+    def add_file(self, path: str, chunks: Iterable[bytes], modified: datetime, compress: bool) -> Iterator[bytes]:
+        """Yield the archive bytes for one file as its content is read from `chunks`.
+
+        Errors reading the first chunk are raised before anything is written,
+        so a missing file can be skipped without corrupting the archive.
+        """
+        chunks = iter(chunks)
+        first = next(chunks, b"")
+        info = self._info(self.unique_name(path), modified)
+        info.external_attr = 0o100644 << 16
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        with self._zip.open(info, "w", force_zip64=True) as entry:
+            entry.write(first)
+            for chunk in chunks:
+                data = self._sink.drain()
+                if data:
+                    yield data
+                entry.write(chunk)
+        yield self._sink.drain()
+
+    def close(self) -> bytes:
+        """The central directory, which ends the archive."""
+        self._zip.close()
+        return self._sink.drain()
+
+    def _info(self, path: str, modified: datetime) -> zipfile.ZipInfo:
+        return zipfile.ZipInfo(path, date_time=max(modified, ZIP_EPOCH).timetuple()[:6])
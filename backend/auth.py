@@ -1,16 +1,34 @@
 import os
 import jwt
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost factor are upgraded on the next login
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 64))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 security = HTTPBearer()
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -18,6 +36,78 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool so it never blocks the event loop.
+    
+    At most `workers` hashes run at once; callers beyond that wait in line,
+    and once `max_queue` are waiting new requests are turned away with a 503
+    instead of piling up.
+    """
+    
+    def __init__(self, workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(workers)
+        self._workers = workers
+        self._max_queue = max_queue
+        self._waiting = 0
+        self._active = 0
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "total_hash_ms": 0.0,
+        }
+    
+    async def run(self, fn, *args):
+        if self._waiting >= self._max_queue:
+            self._stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Too many sign-in requests, please retry")
+        
+        self._waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        started = time.perf_counter()
+        self._active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._slots.release()
+            self._active -= 1
+            wait_ms = (started - queued_at) * 1000
+            self._stats["completed"] += 1
+            self._stats["total_wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+            self._stats["total_hash_ms"] += (time.perf_counter() - started) * 1000
+    
+    def stats(self) -> dict:
+        completed = self._stats["completed"]
+        return {
+            **self._stats,
+            "workers": self._workers,
+            "active": self._active,
+            "queued": self._waiting,
+            "queue_capacity": self._max_queue,
+            "avg_wait_ms": self._stats["total_wait_ms"] / completed if completed else 0.0,
+            "avg_hash_ms": self._stats["total_hash_ms"] / completed if completed else 0.0,
+        }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(hash_password, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password off the event loop.
+    
+    Returns (valid, new_hash); new_hash is set when the stored hash uses an
+    outdated cost factor and should be replaced.
+    """
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
@@ -31,12 +121,108 @@ def decode_token(token: str) -> dict:
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class TokenCache:
+    """Bounded LRU of verified token payloads, keyed by token digest.
+    
+    Entries are dropped once their `exp` passes, so an expired token goes
+    back through jwt.decode and fails there. Revoked digests are remembered
+    until the token would have expired anyway.
+    """
+    
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "revocations": 0}
+    
+    def get(self, digest: str) -> Optional[dict]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        payload, expires = entry
+        if expires is not None and expires <= time.time():
+            del self._entries[digest]
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(digest)
+        self._stats["hits"] += 1
+        return payload
+    
+    def put(self, digest: str, payload: dict):
+        if self._max_size <= 0:
+            return
+        self._entries[digest] = (payload, payload.get("exp"))
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+    
+    def revoke(self, digest: str, expires: Optional[float]):
+        self._entries.pop(digest, None)
+        self._revoked[digest] = expires
+        self._stats["revocations"] += 1
+        if len(self._revoked) > self._max_size:
+            now = time.time()
+            self._revoked = {d: exp for d, exp in self._revoked.items() if exp is None or exp > now}
+    
+    def is_revoked(self, digest: str) -> bool:
+        if digest not in self._revoked:
+            return False
+        expires = self._revoked[digest]
+        if expires is not None and expires <= time.time():
+            # Past its exp the token is rejected by jwt.decode anyway
+            del self._revoked[digest]
+            return False
+        return True
+    
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "capacity": self._max_size,
+            "revoked": len(self._revoked),
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+        }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+def verify_token(token: str) -> dict:
+    """Payload of a valid, unrevoked token, verifying its signature only on a cache miss."""
+    digest = token_digest(token)
+    if token_cache.is_revoked(digest):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = decode_token(token)
+        token_cache.put(digest, payload)
+    return payload
+
+def revoke_token(token: str) -> Tuple[str, Optional[datetime]]:
+    """Revoke a token immediately; returns its digest and expiry for persisting."""
+    payload = verify_token(token)
+    digest = token_digest(token)
+    expires = payload.get("exp")
+    token_cache.revoke(digest, expires)
+    return digest, datetime.utcfromtimestamp(expires) if expires is not None else None
+
+def load_revoked_tokens(revoked: list):
+    """Restore persisted revocations ({"_id": digest, "expires_at": datetime}) after a restart."""
+    for doc in revoked:
+        expires_at = doc.get("expires_at")
+        expires = (expires_at - datetime(1970, 1, 1)).total_seconds() if expires_at else None
+        token_cache.revoke(doc["_id"], expires)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
     token = credentials.credentials
-    payload = decode_token(token)
+    payload = verify_token(token)
     user_id = payload.get("sub")
     if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -0,0 +1,74 @@
+"""Latency of permission checks through AclCache.
+
+Seeds shares on folders for one user into a scratch database, then resolves
+the user's role on items nested --depth folders deep: once cold (grants
+loaded from MongoDB) and many times warm. The warm path should stay well
+under 1ms per check.
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.acl_checks
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from permissions import AclCache  # noqa: E402
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    await client.drop_database(args.db_name)
+    try:
+        owner, user = ObjectId(), ObjectId()
+        folders = [ObjectId() for _ in range(args.shares * 10)]
+        shared = random.sample(folders, args.shares)
+        await db.shares.insert_many([
+            {"item_id": folder_id, "user_id": user, "shared_by": owner, "permission": random.choice(["viewer", "editor"])}
+            for folder_id in shared
+        ])
+        await db.shares.create_index("user_id")
+        items = [
+            {"_id": ObjectId(), "owner_id": owner, "trashed": False, "ancestors": random.sample(folders, args.depth)}
+            for _ in range(args.checks)
+        ]
+
+        acl = AclCache(db)
+        started = time.perf_counter()
+        await acl.role(items[0], user)
+        cold = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        granted = 0
+        for item in items:
+            granted += await acl.role(item, user) is not None
+        warm = (time.perf_counter() - started) * 1000
+
+        print(f"shares: {args.shares}, ancestor depth: {args.depth}")
+        print(f"cold check: {cold:.3f} ms")
+        print(f"warm checks: {args.checks} in {warm:.1f} ms, {warm / args.checks * 1000:.2f} us/check ({granted} granted)")
+    finally:
+        await client.drop_database(args.db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="drive_acl_bench")
+    parser.add_argument("--shares", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--checks", type=int, default=100000)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
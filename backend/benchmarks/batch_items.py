@@ -0,0 +1,75 @@
+"""Throughput of multi-select operations, per-item routes against /items/batch.
+
+Registers a throwaway user on a running API, uploads small files and times
+starring, trashing and restoring them one request at a time and then with a
+single batch request per operation. Everything is permanently deleted at
+the end.
+
+    cd backend
+    API_URL=http://localhost:8001/api python -m benchmarks.batch_items --items 2000
+"""
+import argparse
+import os
+import time
+import uuid
+
+import requests
+
+
+def timed(label, count, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {count:>6} {elapsed * 1000:>10.0f} {count / elapsed:>12.0f}")
+
+
+def run(args):
+    session = requests.Session()
+    email = f"bench-{uuid.uuid4().hex[:12]}@bench.local"
+    response = session.post(f"{args.api_url}/auth/register", json={"email": email, "name": "Bench", "password": "bench-password"})
+    response.raise_for_status()
+    session.headers["Authorization"] = f"Bearer {response.json()['token']}"
+
+    print(f"Uploading {args.items} files ...")
+    ids = []
+    for i in range(args.items):
+        response = session.post(f"{args.api_url}/files/upload", files={"file": (f"bench-{i}.txt", b"x", "text/plain")})
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+
+    def per_item(method, path, **kwargs):
+        def fn():
+            for item_id in ids:
+                session.request(method, f"{args.api_url}{path.format(id=item_id)}", **kwargs).raise_for_status()
+        return fn
+
+    def batched(operation):
+        def fn():
+            response = session.post(f"{args.api_url}/items/batch", json={"ids": ids, "operation": operation})
+            response.raise_for_status()
+            assert response.json()["failed"] == 0, response.json()
+        return fn
+
+    print(f"\n{'operation':<28} {'items':>6} {'total ms':>10} {'items/s':>12}")
+    try:
+        timed("star, per item", len(ids), per_item("PATCH", "/items/{id}", json={"starred": True}))
+        timed("unstar, per item", len(ids), per_item("PATCH", "/items/{id}", json={"starred": False}))
+        timed("star, batch", len(ids), batched("star"))
+        timed("unstar, batch", len(ids), batched("unstar"))
+        timed("trash, per item", len(ids), per_item("DELETE", "/items/{id}"))
+        timed("restore, per item", len(ids), per_item("POST", "/items/{id}/restore"))
+        timed("trash, batch", len(ids), batched("trash"))
+        timed("restore, batch", len(ids), batched("restore"))
+    finally:
+        session.post(f"{args.api_url}/items/batch", json={"ids": ids, "operation": "delete"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api-url", default=os.environ.get("API_URL", "http://localhost:8001/api"))
+    parser.add_argument("--items", type=int, default=2000)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""CPU cost of serializing list responses, model path against the row fast path.
+
+Builds synthetic drive listings and activity feeds and serializes them the
+old way: one Pydantic model per row, then FastAPI's response_model
+validation and jsonable encoding (fastapi.routing.serialize_response), then
+JSONResponse. It compares that with the row dicts and FastJSONResponse from
+serializers.py. No database is needed.
+
+    cd backend
+    python -m benchmarks.list_serialization --rows 1000 --repeat 50
+
+Both paths must produce the same JSON; the benchmark checks that first.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ActivityResponse, DriveItemsResponse, FileResponse, FolderResponse  # noqa: E402
+from serializers import FastJSONResponse, activity_row, file_row, folder_row, orjson  # noqa: E402
+
+
+def seed(rows: int):
+    now = datetime.utcnow()
+    owner_id, parent_id = ObjectId(), ObjectId()
+    folders = [{
+        "_id": ObjectId(), "name": f"Folder {i:05d}", "parent_id": parent_id, "owner_id": owner_id,
+        "created_at": now - timedelta(days=i), "modified_at": now - timedelta(minutes=i),
+        "starred": i % 7 == 0, "trashed": False, "contents": {"bytes": i * 4096, "files": i, "folders": i % 3},
+    } for i in range(rows // 10)]
+    files = [{
+        "_id": ObjectId(), "name": f"file-{i:06d}.pdf", "type": "application/pdf", "size": i * 1024,
+        "folder_id": parent_id, "owner_id": owner_id, "created_at": now - timedelta(days=i),
+        "modified_at": now - timedelta(seconds=i), "starred": i % 5 == 0, "trashed": False,
+        "last_opened": now - timedelta(hours=i) if i % 2 else None,
+        "metadata": {"thumbnail_url": None},
+    } for i in range(rows - len(folders))]
+    activities = [{
+        "_id": ObjectId(), "type": "upload", "item_id": ObjectId(),
+        "description": f"Uploaded file-{i:06d}.pdf", "timestamp": now - timedelta(seconds=i),
+    } for i in range(rows)]
+    return owner_id, folders, files, activities
+
+
+# The model path, as the routes built responses before the fast path
+
+def drive_models(folders, files):
+    return DriveItemsResponse(
+        folders=[FolderResponse(**folder_row(folder)) for folder in folders],
+        files=[FileResponse(**file_row(file)) for file in files],
+        nextCursor=None
+    )
+
+
+def activity_models(activities, user_id):
+    return [ActivityResponse(**activity_row(activity, user_id)) for activity in activities]
+
+
+async def render_models(field, content) -> bytes:
+    return JSONResponse(await serialize_response(field=field, response_content=content)).body
+
+
+async def run(args):
+    owner_id, folders, files, activities = seed(args.rows)
+    user_id = str(owner_id)
+    drive_field = create_response_field(name="Response_get_drive_items", type_=DriveItemsResponse, mode="serialization")
+    activity_field = create_response_field(
+        name="Response_get_activities", type_=List[ActivityResponse], mode="serialization"
+    )
+
+    listings = {
+        "drive items": (
+            lambda: render_models(drive_field, drive_models(folders, files)),
+            lambda: FastJSONResponse({
+                "folders": [folder_row(folder) for folder in folders],
+                "files": [file_row(file) for file in files],
+                "nextCursor": None
+            }).body,
+        ),
+        "activities": (
+            lambda: render_models(activity_field, activity_models(activities, user_id)),
+            lambda: FastJSONResponse([activity_row(activity, user_id) for activity in activities]).body,
+        ),
+    }
+
+    print(f"encoder: {'orjson' if orjson else 'json (orjson not installed)'}, {args.rows} rows per listing\n")
+    print(f"{'listing':<12} {'path':<8} {'cpu ms/listing':>15} {'bytes':>9}")
+    for name, (model_path, fast_path) in listings.items():
+        before, after = await model_path(), fast_path()
+        assert json.loads(before) == json.loads(after), f"{name}: fast path output differs"
+
+        started = time.process_time()
+        for _ in range(args.repeat):
+            await model_path()
+        model_ms = (time.process_time() - started) * 1000 / args.repeat
+
+        started = time.process_time()
+        for _ in range(args.repeat):
+            fast_path()
+        fast_ms = (time.process_time() - started) * 1000 / args.repeat
+
+        print(f"{name:<12} {'models':<8} {model_ms:>15.2f} {len(before):>9}")
+        print(f"{name:<12} {'rows':<8} {fast_ms:>15.2f} {len(after):>9}   ({model_ms / fast_ms:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Query-plan regression benchmark.
+
+Seeds a large synthetic dataset into a scratch database, applies the index
+manifest from indexes.py and checks with explain() that every route's query
+shape is answered from an index and examines a bounded number of documents.
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.query_plans --files-per-folder 500
+
+Exits non-zero if any query shape regresses to a collection scan or examines
+more documents than its budget.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import ensure_indexes  # noqa: E402
+from pagination import keyset_filter  # noqa: E402
+from search import query_keys, search_fields, tokenize  # noqa: E402
+
+PAGE = 50
+BATCH = 10000
+MIME_TYPES = ["application/pdf", "image/jpeg", "video/mp4", "text/plain", "application/zip"]
+
+
+async def insert_batched(collection, docs):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == BATCH:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def seed(db, users, folders_per_user, files_per_folder):
+    """Insert the synthetic dataset and return ids used by the query shapes."""
+    now = datetime.utcnow()
+    user_ids = [ObjectId() for _ in range(users)]
+    await db.users.insert_many([
+        {"_id": uid, "email": f"user{i}@bench.local", "name": f"User {i}", "storage_used": 0}
+        for i, uid in enumerate(user_ids)
+    ])
+
+    folder_ids = {uid: [ObjectId() for _ in range(folders_per_user)] for uid in user_ids}
+    await insert_batched(db.folders, (
+        {
+            "_id": fid,
+            "name": f"Folder {j:05d}",
+            **search_fields(f"Folder {j:05d}"),
+            "parent_id": None,
+            "ancestors": [],
+            "owner_id": uid,
+            "created_at": now - timedelta(minutes=j),
+            "modified_at": now - timedelta(minutes=j),
+            "starred": j % 20 == 0,
+            "trashed": j % 50 == 0,
+            "contents": {"bytes": random.randint(0, 10 ** 9), "files": files_per_folder, "folders": 0},
+        }
+        for uid in user_ids for j, fid in enumerate(folder_ids[uid])
+    ))
+
+    file_ids = []
+
+    def files():
+        for uid in user_ids:
+            for fid in folder_ids[uid]:
+                for k in range(files_per_folder):
+                    file_id = ObjectId()
+                    file_ids.append(file_id)
+                    yield {
+                        "_id": file_id,
+                        "name": f"file-{k:06d}.bin",
+                        **search_fields(f"file-{k:06d}.bin"),
+                        "type": random.choice(MIME_TYPES),
+                        "size": random.randint(1, 10 ** 9),
+                        "blob_id": f"{k:064x}",
+                        "folder_id": fid,
+                        "ancestors": [fid],
+                        "owner_id": uid,
+                        "created_at": now - timedelta(seconds=k),
+                        "modified_at": now - timedelta(seconds=k),
+                        "last_opened": now - timedelta(seconds=k) if k % 100 == 0 else None,
+                        "starred": k % 97 == 0,
+                        "trashed": k % 89 == 0,
+                        "metadata": {"original_filename": f"file-{k:06d}.bin", "thumbnail_url": None},
+                    }
+
+    await insert_batched(db.files, files())
+
+    sample_files = random.sample(file_ids, min(len(file_ids), 2000))
+    await insert_batched(db.shares, (
+        {"item_id": file_id, "user_id": random.choice(user_ids), "shared_by": user_ids[0], "permission": "viewer", "shared_at": now}
+        for file_id in sample_files
+    ))
+    await insert_batched(db.comments, (
+        {"file_id": sample_files[i % 20], "user_id": random.choice(user_ids), "text": "comment", "created_at": now - timedelta(seconds=i)}
+        for i in range(5000)
+    ))
+    await insert_batched(db.activities, (
+        {"type": "upload", "user_id": uid, "item_id": None, "description": "Uploaded", "timestamp": now - timedelta(seconds=i)}
+        for uid in user_ids for i in range(5000)
+    ))
+    await insert_batched(db.upload_sessions, (
+        {"owner_id": user_ids[0], "status": "open", "received": [], "expires_at": now + timedelta(hours=i - 5)}
+        for i in range(1000)
+    ))
+    await insert_batched(db.blobs, (
+        {"_id": f"{i:064x}", "size": 1, "refcount": 0 if i % 10 == 0 else 1,
+         "zero_since": now - timedelta(hours=i % 48) if i % 10 == 0 else None}
+        for i in range(files_per_folder)
+    ))
+
+    return {
+        "user_id": user_ids[0],
+        "folder_id": folder_ids[user_ids[0]][1],
+        "file_id": sample_files[0],
+        "share_user_id": user_ids[1 % users],
+        "files_per_folder": files_per_folder,
+        "now": now,
+    }
+
+
+def query_shapes(ctx):
+    """(name, collection, filter, sort, limit, max_docs_examined) for every route query."""
+    uid, fid, now = ctx["user_id"], ctx["folder_id"], ctx["now"]
+    files_per_folder = ctx["files_per_folder"]
+    shapes = [
+        ("login: users by email", "users", {"email": "user0@bench.local"}, None, 1, 1),
+        ("download: file by id", "files", {"_id": ctx["file_id"]}, None, 1, 1),
+        ("recent view", "files", {"owner_id": uid, "last_opened": {"$ne": None}, "trashed": False},
+         [("last_opened", DESCENDING)], 20, 20),
+        ("acl cache: shares by user", "shares", {"user_id": ctx["share_user_id"]}, None, 0, 2000),
+        ("get_shares: shares by item", "shares", {"item_id": ctx["file_id"]}, None, 0, 10),
+        ("get_comments: comments by file", "comments", {"file_id": ctx["file_id"]}, [("created_at", ASCENDING)], 0, 250),
+        ("activities feed", "activities", {"user_id": uid}, [("timestamp", DESCENDING)], 20, 20),
+        ("upload session cleanup", "upload_sessions", {"expires_at": {"$lt": now}}, None, 1000, 1000),
+        ("search: files by name prefix, first word", "files",
+         {"owner_id": uid, "trashed": False, "search_keys": {"$all": query_keys(tokenize("file 00012"))},
+          "search_first": "file"}, None, 500, 1000),
+        ("search: files by name prefix, other words", "files",
+         {"owner_id": uid, "trashed": False, "search_keys": {"$all": query_keys(tokenize("file 00012"))},
+          "search_first": {"$ne": "file"}}, None, 500, 1000),
+        ("search: folders by name prefix, first word", "folders",
+         {"owner_id": uid, "trashed": False, "parent_id": None, "search_keys": {"$all": query_keys(tokenize("folder 0004"))},
+          "search_first": "folder"}, None, 500, 10),
+        ("folder tree: live folders of a user", "folders", {"owner_id": uid, "trashed": False}, None, 0, 200),
+        ("subtree: files below a folder", "files", {"ancestors": fid, "trashed": False}, None, 0, files_per_folder),
+        ("subtree: folders below a folder", "folders", {"ancestors": fid}, None, 0, 0),
+        ("archive: files below a folder, later page", "files",
+         {"ancestors": fid, "trashed": False, "_id": {"$gt": ctx["file_id"]}}, [("_id", ASCENDING)], 500, 500),
+        ("blob collector", "blobs", {"refcount": {"$lte": 0}, "zero_since": {"$lt": now - timedelta(hours=1)}},
+         None, 500, 500),
+    ]
+
+    listings = [
+        ("drive", "folders", {"owner_id": uid, "parent_id": None, "trashed": False}, ["name", "modified_at", "contents.bytes"]),
+        ("drive", "files", {"owner_id": uid, "folder_id": fid, "trashed": False}, ["name", "modified_at", "size"]),
+        ("starred", "folders", {"owner_id": uid, "starred": True, "trashed": False}, ["name", "modified_at", "contents.bytes"]),
+        ("starred", "files", {"owner_id": uid, "starred": True, "trashed": False}, ["name", "modified_at", "size"]),
+        ("trash", "folders", {"owner_id": uid, "trashed": True, "trashed_by": None}, ["name", "modified_at", "contents.bytes"]),
+        ("trash", "files", {"owner_id": uid, "trashed": True, "trashed_by": None}, ["name", "modified_at", "size"]),
+    ]
+    # Keyset pivots somewhere in the middle of each sort order
+    pivots = {
+        "folders": {"name": "Folder 00050", "modified_at": now - timedelta(minutes=50), "contents.bytes": 5 * 10 ** 8},
+        "files": {"name": "file-000100.bin", "modified_at": now - timedelta(seconds=100), "size": 5 * 10 ** 8},
+    }
+    for view, collection, query, fields in listings:
+        for field in fields:
+            for direction in (ASCENDING, DESCENDING):
+                sort = [(field, direction), ("_id", direction)]
+                order = "asc" if direction == ASCENDING else "desc"
+                shapes.append((f"{view} {collection} by {field} {order}, first page",
+                               collection, query, sort, PAGE + 1, PAGE + 1))
+                shapes.append((f"{view} {collection} by {field} {order}, later page",
+                               collection, {"$and": [query, keyset_filter(field, direction, pivots[collection][field], ObjectId())]},
+                               sort, PAGE + 1, PAGE + 2))
+    return shapes
+
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree (classic or SBE layout)."""
+    stages = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.add(node["stage"])
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return stages
+
+
+async def explain(db, collection, query, sort, limit):
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await cursor.explain()
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    await client.drop_database(args.db_name)
+    failures = 0
+    try:
+        print(f"Seeding {args.users} users x {args.folders_per_user} folders x {args.files_per_folder} files ...")
+        ctx = await seed(db, args.users, args.folders_per_user, args.files_per_folder)
+        await ensure_indexes(db)
+
+        print(f"{'query shape':<58} {'plan':<8} {'examined':>9} {'budget':>7} {'ms':>5}")
+        for name, collection, query, sort, limit, budget in query_shapes(ctx):
+            result = await explain(db, collection, query, sort, limit)
+            stages = plan_stages(result["queryPlanner"]["winningPlan"])
+            stats = result["executionStats"]
+            examined = stats["totalDocsExamined"]
+            indexed = "COLLSCAN" not in stages and bool(stages & {"IXSCAN", "IDHACK", "EXPRESS_IXSCAN", "EXPRESS_IDHACK"})
+            ok = indexed and examined <= budget
+            failures += not ok
+            print(f"{name:<58} {'index' if indexed else 'SCAN':<8} {examined:>9} {budget:>7} "
+                  f"{stats['executionTimeMillis']:>5}{'' if ok else '  FAIL'}")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db_name)
+        client.close()
+
+    print(f"\n{failures} query shape(s) failed" if failures else "\nAll query shapes use an index within budget")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="drive_query_plan_bench")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--folders-per-user", type=int, default=100)
+    parser.add_argument("--files-per-folder", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
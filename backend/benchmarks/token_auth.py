@@ -0,0 +1,55 @@
+"""Per-request authentication overhead with and without the token cache.
+
+Resolves the current user from a bearer token the way every route does,
+once with a full jwt.decode per request and once through the verified-token
+cache in auth.py. No database is needed.
+
+    cd backend
+    python -m benchmarks.token_auth --requests 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import create_access_token, decode_token, get_current_user, token_cache  # noqa: E402
+
+
+async def resolve_uncached(credentials):
+    return decode_token(credentials.credentials)["sub"]
+
+
+async def resolve_cached(credentials):
+    return await get_current_user(credentials)
+
+
+async def run(args):
+    tokens = [
+        HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"sub": f"user-{i}"}))
+        for i in range(args.users)
+    ]
+
+    print(f"{'mode':<10} {'requests':>9} {'total ms':>10} {'us/request':>11}")
+    for name, resolve in (("decode", resolve_uncached), ("cached", resolve_cached)):
+        started = time.perf_counter()
+        for i in range(args.requests):
+            await resolve(tokens[i % len(tokens)])
+        elapsed = time.perf_counter() - started
+        print(f"{name:<10} {args.requests:>9} {elapsed * 1000:>10.1f} {elapsed / args.requests * 1e6:>11.2f}")
+    print(f"\ncache: {token_cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000, help="distinct tokens in rotation")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
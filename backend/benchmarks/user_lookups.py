@@ -0,0 +1,95 @@
+"""Round-trip benchmark for hydrating user names on comment lists.
+
+Seeds comments by distinct users into a scratch database and counts the
+`find` commands sent to the users collection while hydrating lists of
+growing size, per-row `find_one` (the old get_comments) against UserLoader.
+
+    cd backend
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.user_lookups
+
+UserLoader should stay at one round trip however long the list gets.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loaders import UserLoader  # noqa: E402
+
+
+class UserQueryCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name == "find" and event.command.get("find") == "users":
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def hydrate_per_row(db, comments):
+    return [await db.users.find_one({"_id": comment["user_id"]}) for comment in comments]
+
+
+async def hydrate_batched(db, comments):
+    return await UserLoader(db).load_many(comment["user_id"] for comment in comments)
+
+
+async def run(args):
+    counter = UserQueryCounter()
+    client = AsyncIOMotorClient(args.mongo_url, event_listeners=[counter])
+    db = client[args.db_name]
+    await client.drop_database(args.db_name)
+    try:
+        largest = max(args.sizes)
+        user_ids = [ObjectId() for _ in range(largest)]
+        await db.users.insert_many([
+            {"_id": uid, "email": f"user{i}@bench.local", "name": f"User {i}"}
+            for i, uid in enumerate(user_ids)
+        ])
+        file_id = ObjectId()
+        await db.comments.insert_many([
+            {"file_id": file_id, "user_id": uid, "text": "comment", "created_at": datetime.utcnow()}
+            for uid in user_ids
+        ])
+
+        print(f"{'comments':>9} {'per-row trips':>14} {'per-row ms':>11} {'batched trips':>14} {'batched ms':>11}")
+        for size in args.sizes:
+            comments = await db.comments.find({"file_id": file_id}).limit(size).to_list(size)
+            row = [size]
+            for hydrate in (hydrate_per_row, hydrate_batched):
+                counter.count = 0
+                started = time.perf_counter()
+                users = await hydrate(db, comments)
+                elapsed = (time.perf_counter() - started) * 1000
+                assert all(users), "every comment author should resolve"
+                row += [counter.count, elapsed]
+            print(f"{row[0]:>9} {row[1]:>14} {row[2]:>11.1f} {row[3]:>14} {row[4]:>11.1f}")
+    finally:
+        await client.drop_database(args.db_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default="drive_user_lookup_bench")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 500, 1000])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
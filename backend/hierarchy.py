@@ -0,0 +1,186 @@
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+# Every folder and file carries `ancestors`: the ids of the folders above it,
+# root first (a file's list ends with its own folder_id). A whole subtree is
+# then one indexed match, {"ancestors": folder_id}, instead of a walk down
+# parent_id links.
+#
+# Items trashed along with a folder get `trashed_by` set to that folder's id,
+# so restoring the folder brings back exactly what its trashing hid and
+# leaves items that were trashed on their own where they are.
+BACKFILL_BATCH_SIZE = 1000
+
+
+def child_ancestors(parent: Optional[dict]) -> List:
+    """Ancestors of an item placed directly inside `parent` (None for the root)."""
+    if parent is None:
+        return []
+    return parent.get("ancestors", []) + [parent["_id"]]
+
+
+def subtree_filter(folder_id, **extra) -> dict:
+    """Everything below a folder, not including the folder itself."""
+    return {"ancestors": folder_id, **extra}
+
+
+def rebase_ancestors(old_ancestors: List, new_ancestors: List) -> list:
+    """Update pipeline moving a subtree: swap the old ancestor prefix for the new one.
+
+    Applied with update_many to everything below the moved folder, so a move
+    costs one update per collection however deep the subtree is.
+    """
+    return [{"$set": {"ancestors": {"$concatArrays": [
+        new_ancestors,
+        {"$slice": ["$ancestors", len(old_ancestors), {"$size": "$ancestors"}]}
+    ]}}}]
+
+
+async def backfill_ancestors(db):
+    """Compute `ancestors` for items created before the field existed."""
+    while True:
+        # $graphLookup walks each folder's parent chain in one round trip and
+        # copes with orphans and cycles left behind by older code
+        folders = await db.folders.aggregate([
+            {"$match": {"ancestors": {"$exists": False}}},
+            {"$limit": BACKFILL_BATCH_SIZE},
+            {"$graphLookup": {
+                "from": "folders",
+                "startWith": "$parent_id",
+                "connectFromField": "parent_id",
+                "connectToField": "_id",
+                "as": "chain",
+                "depthField": "depth"
+            }},
+            {"$project": {"chain._id": 1, "chain.depth": 1}}
+        ]).to_list(BACKFILL_BATCH_SIZE)
+        if not folders:
+            break
+        await db.folders.bulk_write([
+            UpdateOne({"_id": folder["_id"]}, {"$set": {"ancestors": [
+                link["_id"] for link in sorted(folder["chain"], key=lambda link: -link["depth"])
+            ]}})
+            for folder in folders
+        ], ordered=False)
+
+    while True:
+        files = await db.files.find(
+            {"ancestors": {"$exists": False}},
+            {"folder_id": 1}
+        ).limit(BACKFILL_BATCH_SIZE).to_list(BACKFILL_BATCH_SIZE)
+        if not files:
+            break
+        folder_ids = list({file["folder_id"] for file in files if file.get("folder_id")})
+        parents = {
+            folder["_id"]: folder
+            for folder in await db.folders.find({"_id": {"$in": folder_ids}}, {"ancestors": 1}).to_list(None)
+        }
+        updates = []
+        for file in files:
+            folder_id = file.get("folder_id")
+            if folder_id is None:
+                ancestors = []
+            elif folder_id in parents:
+                ancestors = child_ancestors(parents[folder_id])
+            else:
+                ancestors = [folder_id]
+            updates.append(UpdateOne({"_id": file["_id"]}, {"$set": {"ancestors": ancestors}}))
+        await db.files.bulk_write(updates, ordered=False)
+
+
+# Each folder keeps `contents` = {bytes, files, folders}, the recursive totals
+# of what it holds. A descendant counts towards a folder while it is live, or
+# while it is only hidden because that folder (or one above it) was trashed,
+# so trashing or restoring a folder only touches the totals above it.
+CONTENTS_BATCH_SIZE = 500
+EMPTY_CONTENTS = {"bytes": 0, "files": 0, "folders": 0}
+
+
+def contents_changes(sign: int, size: int = 0, files: int = 0, folders: int = 0) -> dict:
+    """$inc adding items to (sign=1) or removing them from (sign=-1) a folder's totals."""
+    return {"contents.bytes": sign * size, "contents.files": sign * files, "contents.folders": sign * folders}
+
+
+def file_contents_changes(file_doc: dict, sign: int) -> dict:
+    return contents_changes(sign, file_doc["size"], files=1)
+
+
+def folder_contents_changes(folder: dict, sign: int) -> dict:
+    """contents_changes() for a folder together with everything counted inside it."""
+    contents = folder.get("contents", EMPTY_CONTENTS)
+    return contents_changes(sign, contents["bytes"], contents["files"], contents["folders"] + 1)
+
+
+def counted_by(item: dict) -> List:
+    """The ancestors whose totals currently include `item`."""
+    ancestors = item.get("ancestors", [])
+    if not item.get("trashed"):
+        return ancestors
+    if item.get("trashed_by") in ancestors:
+        return ancestors[ancestors.index(item["trashed_by"]):]
+    return []
+
+
+def accumulate_contents(pending: dict, ancestors: List, changes: dict):
+    """Collect a totals change for each ancestor into `pending` ({folder_id: $inc})."""
+    for ancestor in ancestors:
+        totals = pending.setdefault(ancestor, {})
+        for key, value in changes.items():
+            totals[key] = totals.get(key, 0) + value
+
+
+async def apply_contents(db, pending: dict):
+    """Write totals collected by accumulate_contents() with one bulk_write."""
+    updates = [UpdateOne({"_id": folder_id}, {"$inc": changes}) for folder_id, changes in pending.items() if any(changes.values())]
+    if updates:
+        await db.folders.bulk_write(updates, ordered=False)
+
+
+async def propagate_contents(db, ancestors: List, changes: dict):
+    """Apply a totals change to every listed ancestor with one update."""
+    if ancestors and any(changes.values()):
+        await db.folders.update_many({"_id": {"$in": list(ancestors)}}, {"$inc": changes})
+
+
+async def _descendant_totals(collection, folder_ids: List, size) -> dict:
+    """{folder_id: (bytes, count)} of the items counted towards each folder."""
+    trashed_at = {"$indexOfArray": ["$ancestors", "$trashed_by"]}
+    totals = await collection.aggregate([
+        {"$match": {"ancestors": {"$in": folder_ids}}},
+        {"$project": {"size": size, "trashed": 1, "trashed_by": 1, "ancestors": 1, "folder": "$ancestors"}},
+        {"$unwind": {"path": "$folder", "includeArrayIndex": "depth"}},
+        {"$match": {"folder": {"$in": folder_ids}}},
+        {"$match": {"$expr": {"$or": [
+            {"$ne": ["$trashed", True]},
+            {"$and": [{"$gte": [trashed_at, 0]}, {"$lte": [trashed_at, "$depth"]}]}
+        ]}}},
+        {"$group": {"_id": "$folder", "bytes": {"$sum": "$size"}, "count": {"$sum": 1}}}
+    ], allowDiskUse=True).to_list(None)
+    return {total["_id"]: (total["bytes"], total["count"]) for total in totals}
+
+
+async def recompute_folder_contents(db, folder_ids: List):
+    """Recompute `contents` of the given folders from their descendants."""
+    files = await _descendant_totals(db.files, folder_ids, "$size")
+    folders = await _descendant_totals(db.folders, folder_ids, {"$literal": 0})
+    await db.folders.bulk_write([
+        UpdateOne({"_id": folder_id}, {"$set": {"contents": {
+            "bytes": files.get(folder_id, (0, 0))[0],
+            "files": files.get(folder_id, (0, 0))[1],
+            "folders": folders.get(folder_id, (0, 0))[1],
+        }}})
+        for folder_id in folder_ids
+    ], ordered=False)
+
+
+async def backfill_folder_contents(db):
+    """Compute `contents` for folders created before the totals existed."""
+    while True:
+        folders = await db.folders.find(
+            {"contents": {"$exists": False}},
+            {"_id": 1}
+        ).limit(CONTENTS_BATCH_SIZE).to_list(CONTENTS_BATCH_SIZE)
+        if not folders:
+            break
+        await recompute_folder_contents(db, [folder["_id"] for folder in folders])
@@ -0,0 +1,136 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+STARRED = {"starred": True, "trashed": False}
+TRASHED = {"trashed": True}
+SORT_LABELS = {"name": "name", "modified_at": "modified", "size": "size", "contents.bytes": "size"}
+
+
+def _listing(parent_field: str, sort_field: str) -> IndexModel:
+    """Folder contents sorted by `sort_field` (drive view)."""
+    return IndexModel(
+        [("owner_id", ASCENDING), (parent_field, ASCENDING), ("trashed", ASCENDING), (sort_field, ASCENDING), ("_id", ASCENDING)],
+        name=f"listing_by_{SORT_LABELS[sort_field]}"
+    )
+
+
+def _view(flag: str, partial_filter: dict, sort_field: str) -> IndexModel:
+    """A user's items in a flagged view (starred, trash) sorted by `sort_field`.
+
+    Partial, so only the (usually few) flagged items are indexed.
+    """
+    return IndexModel(
+        [("owner_id", ASCENDING), (flag, ASCENDING), (sort_field, ASCENDING), ("_id", ASCENDING)],
+        name=f"{flag}_by_{SORT_LABELS[sort_field]}",
+        partialFilterExpression=partial_filter
+    )
+
+
+# Declarative index manifest, applied at startup by ensure_indexes().
+# Every query a route issues should be served by one of these; the
+# benchmarks/query_plans.py benchmark checks that with explain().
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email", unique=True),
+    ],
+    "folders": [
+        _listing("parent_id", "name"),
+        _listing("parent_id", "modified_at"),
+        _listing("parent_id", "contents.bytes"),
+        _view("starred", STARRED, "name"),
+        _view("starred", STARRED, "modified_at"),
+        _view("starred", STARRED, "contents.bytes"),
+        _view("trashed", TRASHED, "name"),
+        _view("trashed", TRASHED, "modified_at"),
+        _view("trashed", TRASHED, "contents.bytes"),
+        IndexModel([("owner_id", ASCENDING), ("search_keys", ASCENDING)], name="name_search"),
+        IndexModel([("owner_id", ASCENDING), ("search_first", ASCENDING)], name="first_word_search"),
+        # Subtree operations match {"ancestors": folder_id}
+        IndexModel([("ancestors", ASCENDING)], name="subtree"),
+    ],
+    "files": [
+        _listing("folder_id", "name"),
+        _listing("folder_id", "modified_at"),
+        _listing("folder_id", "size"),
+        _view("starred", STARRED, "name"),
+        _view("starred", STARRED, "modified_at"),
+        _view("starred", STARRED, "size"),
+        _view("trashed", TRASHED, "name"),
+        _view("trashed", TRASHED, "modified_at"),
+        _view("trashed", TRASHED, "size"),
+        IndexModel(
+            [("owner_id", ASCENDING), ("trashed", ASCENDING), ("last_opened", DESCENDING)],
+            name="recent"
+        ),
+        IndexModel([("owner_id", ASCENDING), ("search_keys", ASCENDING)], name="name_search"),
+        IndexModel([("owner_id", ASCENDING), ("search_first", ASCENDING)], name="first_word_search"),
+        # Subtree operations match {"ancestors": folder_id}; archives page
+        # through a subtree in _id order
+        IndexModel([("ancestors", ASCENDING), ("_id", ASCENDING)], name="subtree_by_id"),
+    ],
+    "shares": [
+        IndexModel([("item_id", ASCENDING), ("user_id", ASCENDING)], name="item_user"),
+        IndexModel([("user_id", ASCENDING)], name="user"),
+    ],
+    "comments": [
+        IndexModel([("file_id", ASCENDING), ("created_at", ASCENDING)], name="file_created"),
+    ],
+    "activities": [
+        # Keyset pagination of the feed on (timestamp, _id)
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="user_feed"),
+    ],
+    "activity_rollups": [
+        IndexModel([("user_id", ASCENDING), ("day", DESCENDING)], name="user_day", unique=True),
+    ],
+    "upload_sessions": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "revoked_tokens": [
+        # Revocations are only needed until the token would have expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0),
+    ],
+    "blobs": [
+        IndexModel(
+            [("zero_since", ASCENDING)],
+            name="unreferenced",
+            partialFilterExpression={"refcount": {"$lte": 0}}
+        ),
+    ],
+}
+
+
+async def ensure_indexes(db):
+    """Create every index in INDEXES; existing identical indexes are left alone."""
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except Exception:
+            # A conflicting definition or duplicate keys must not keep the API down
+            logger.exception("Could not create indexes on %s", collection)
+
+
+async def ensure_ttl_index(collection, field: str, seconds: int, name: str):
+    """Keep a single-field index on `field` that expires documents after `seconds`.
+
+    With seconds=0 the index is kept without an expiry, so range scans on
+    `field` stay indexed whether or not retention is configured.
+    """
+    expire_after = seconds or None
+    try:
+        existing = (await collection.index_information()).get(name)
+        if existing is not None and existing.get("expireAfterSeconds") != expire_after:
+            if expire_after and existing.get("expireAfterSeconds") is not None:
+                # Only the expiry changed: retune in place
+                await collection.database.command({
+                    "collMod": collection.name,
+                    "index": {"name": name, "expireAfterSeconds": expire_after}
+                })
+                return
+            await collection.drop_index(name)
+        options = {"expireAfterSeconds": expire_after} if expire_after else {}
+        await collection.create_index([(field, ASCENDING)], name=name, **options)
+    except Exception:
+        logger.exception("Could not apply TTL index %s on %s", name, collection.name)
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+
+MAX_BATCH_SIZE = 1000
+
+
+class UserLoader:
+    """Request-scoped, DataLoader-style batching of user lookups.
+
+    Every load() made before the event loop gets back to the loader is
+    resolved by one `users.find({"_id": {"$in": [...]}})`, so hydrating a
+    list of N rows costs one round trip instead of N. Results are cached for
+    the lifetime of the loader, which should be a single request.
+    """
+
+    def __init__(self, db, projection: Optional[dict] = None):
+        self._db = db
+        self._projection = projection or {"name": 1, "email": 1}
+        self._cache: Dict[ObjectId, asyncio.Future] = {}
+        self._pending: Dict[ObjectId, asyncio.Future] = {}
+        self._dispatch_scheduled = False
+        # The loop only keeps weak references to tasks; hold dispatches until they finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, user_id) -> "asyncio.Future[Optional[dict]]":
+        user_id = ObjectId(user_id)
+        future = self._cache.get(user_id)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[user_id] = future
+        self._pending[user_id] = future
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            loop.call_soon(self._start_dispatch)
+        return future
+
+    async def load_many(self, user_ids: Iterable) -> List[Optional[dict]]:
+        return await asyncio.gather(*(self.load(user_id) for user_id in user_ids))
+
+    def _start_dispatch(self):
+        pending, self._pending = self._pending, {}
+        self._dispatch_scheduled = False
+        task = asyncio.get_running_loop().create_task(self._dispatch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(lambda task: self._dispatch_done(task, pending))
+
+    def _dispatch_done(self, task: asyncio.Task, pending: Dict[ObjectId, asyncio.Future]):
+        self._tasks.discard(task)
+        cancelled = task.cancelled()
+        error = None if cancelled else task.exception()
+        if not cancelled and error is None:
+            return
+        # Nothing may be left waiting on a dispatch that died
+        for user_id, future in pending.items():
+            if not future.done():
+                if cancelled:
+                    future.cancel()
+                else:
+                    future.set_exception(error)
+                self._cache.pop(user_id, None)
+
+    async def _dispatch(self, pending: Dict[ObjectId, asyncio.Future]):
+        ids = list(pending)
+        for start in range(0, len(ids), MAX_BATCH_SIZE):
+            batch = ids[start:start + MAX_BATCH_SIZE]
+            try:
+                users = await self._db.users.find({"_id": {"$in": batch}}, self._projection).to_list(None)
+            except Exception as e:
+                for user_id in batch:
+                    if not pending[user_id].done():
+                        pending[user_id].set_exception(e)
+                    # Let a later request retry rather than caching the failure
+                    self._cache.pop(user_id, None)
+                continue
+            by_id = {user["_id"]: user for user in users}
+            for user_id in batch:
+                # A waiter that gave up may have cancelled its future
+                if not pending[user_id].done():
+                    pending[user_id].set_result(by_id.get(user_id))
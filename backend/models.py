@@ -49,6 +49,17 @@ class FolderResponse(BaseModel):
     modified: str
     starred: bool = False
     trashed: bool = False
+    # Recursive totals of everything inside the folder
+    size: int = 0
+    itemCount: int = 0
+
+class FolderNode(BaseModel):
+    id: str
+    name: str
+    parentId: Optional[str] = None
+
+class FolderTreeResponse(BaseModel):
+    folders: List[FolderNode]
 
 class FileResponse(BaseModel):
     id: str
@@ -65,12 +76,48 @@ class FileResponse(BaseModel):
     lastOpened: Optional[str] = None
     url: Optional[str] = None
 
+class UploadSessionCreate(BaseModel):
+    name: str
+    type: str = "application/octet-stream"
+    size: int
+    folderId: Optional[str] = None
+    chunkSize: Optional[int] = None
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    name: str
+    size: int
+    chunkSize: int
+    totalChunks: int
+    receivedChunks: List[int]
+    receivedBytes: int
+    expiresAt: str
+
 class ItemUpdate(BaseModel):
     name: Optional[str] = None
     starred: Optional[bool] = None
     parentId: Optional[str] = None
     folderId: Optional[str] = None
 
+class ItemBatchRequest(BaseModel):
+    ids: List[str]
+    operation: str  # star, unstar, move, trash, restore, delete
+    folderId: Optional[str] = None  # move target; omitted moves to the root
+
+class ItemBatchResult(BaseModel):
+    id: str
+    success: bool
+    error: Optional[str] = None
+
+class ItemBatchResponse(BaseModel):
+    results: List[ItemBatchResult]
+    succeeded: int
+    failed: int
+
+class ItemArchiveRequest(BaseModel):
+    ids: List[str]
+    name: Optional[str] = None  # archive file name, without .zip
+
 class ShareCreate(BaseModel):
     itemId: str
     email: str
@@ -110,11 +157,19 @@ class ActivityResponse(BaseModel):
     description: str
     timestamp: str
 
+class ActivitySummary(BaseModel):
+    day: str
+    counts: dict
+    total: int
+
 class StorageResponse(BaseModel):
     used: int
     total: int
     breakdown: dict
+    counts: dict = {}
+    physical: int = 0
 
 class DriveItemsResponse(BaseModel):
     folders: List[FolderResponse]
     files: List[FileResponse]
+    nextCursor: Optional[str] = None
@@ -0,0 +1,62 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId, json_util
+from pymongo import ASCENDING
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(state: dict) -> str:
+    """Encode a continuation state as an opaque, URL-safe token."""
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        state = json_util.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(state, dict):
+        raise InvalidCursor("Invalid cursor")
+    return state
+
+
+# Values a sort key may take in a cursor; anything else (a dict in
+# particular) could smuggle a query operator into keyset_filter()
+CURSOR_VALUE_TYPES = (str, int, float, datetime, type(None))
+
+
+def cursor_after(state: dict) -> Optional[tuple]:
+    """The (value, last_id) position stored in a cursor state, or None at the start.
+
+    Raises InvalidCursor unless it is a [scalar, ObjectId] pair.
+    """
+    after = state.get("after")
+    if after is None:
+        return None
+    if (
+        not isinstance(after, list) or len(after) != 2
+        or not isinstance(after[0], CURSOR_VALUE_TYPES) or not isinstance(after[1], ObjectId)
+    ):
+        raise InvalidCursor("Invalid cursor")
+    return after[0], after[1]
+
+
+def sort_value(doc: dict, field: str):
+    """The value of a sort field, which may be a dotted path, in a fetched document."""
+    for part in field.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def keyset_filter(field: str, direction: int, value, last_id) -> dict:
+    """Match documents strictly after (value, last_id) in a (field, _id) ordering."""
+    op = "$gt" if direction == ASCENDING else "$lt"
+    return {"$or": [{field: {op: value}}, {field: value, "_id": {op: last_id}}]}
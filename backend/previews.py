@@ -0,0 +1,55 @@
+import codecs
+from typing import Iterable, Optional, Tuple
+
+DEFAULT_CHARSET = "utf-8"
+
+
+def charset_of(content_type: str) -> str:
+    """The codec named by a `charset=` parameter, or UTF-8 when absent or unknown."""
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            try:
+                return codecs.lookup(value.strip().strip('"')).name
+            except LookupError:
+                break
+    return DEFAULT_CHARSET
+
+
+def _ascii_compatible(charset: str) -> bool:
+    return "\n".encode(charset) == b"\n"
+
+
+def decode_text_window(chunks: Iterable[bytes], start: int, size: int,
+                       charset: str = DEFAULT_CHARSET) -> Tuple[str, Optional[int]]:
+    """Decode the bytes of a text file read from offset `start`.
+
+    `chunks` is the stored content from `start` onwards, already limited to
+    the page length. Undecodable bytes become U+FFFD instead of failing. Unless
+    the window reaches the end of the file, it is cut after its last newline
+    (or, on one very long line, before a split character) so pages join up
+    cleanly. Returns the text and the offset of the next page, None at EOF.
+    """
+    data = b"".join(chunks)
+    utf8 = codecs.lookup(charset).name == "utf-8"
+    skip = 0
+    if utf8:
+        if start == 0 and data.startswith(codecs.BOM_UTF8):
+            skip = len(codecs.BOM_UTF8)
+        # A caller-chosen offset may land inside a character; start at the next one
+        while start > 0 and skip < min(3, len(data)) and 0x80 <= data[skip] < 0xC0:
+            skip += 1
+    body = data[skip:]
+
+    at_eof = start + len(data) >= size
+    if not at_eof and _ascii_compatible(charset):
+        newline = body.rfind(b"\n")
+        if newline >= 0:
+            body = body[:newline + 1]
+
+    decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    text = decoder.decode(body, final=at_eof)
+    # An incomplete trailing character stays buffered and starts the next page
+    pending = len(decoder.getstate()[0])
+    next_offset = start + skip + len(body) - pending
+    return text, next_offset if next_offset < size else None
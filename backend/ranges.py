@@ -0,0 +1,196 @@
+import posixpath
+import unicodedata
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a `Range: bytes=...` header into sorted, merged (start, end) pairs.
+
+    `end` is exclusive. Returns None when the header is malformed or asks for
+    too many ranges, in which case the full body should be sent. Raises
+    RangeNotSatisfiable when none of the ranges overlap the content.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if len(parts) > MAX_RANGES:
+        return None
+    for part in parts:
+        first, sep, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or not (first or last):
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) + 1 if last else size
+                if last and end <= start:
+                    return None
+            else:
+                suffix = int(last)
+                if suffix == 0:
+                    continue
+                start, end = max(0, size - suffix), size
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def multipart_byteranges(
+    ranges: List[Tuple[int, int]],
+    size: int,
+    content_type: str,
+    read_range: Callable[[int, int], Iterator[bytes]],
+) -> Tuple[str, int, Iterator[bytes]]:
+    """Build a multipart/byteranges body.
+
+    Returns (boundary, content_length, body_iterator). Only the requested
+    ranges are read, lazily, through `read_range(start, end)`.
+    """
+    boundary = uuid.uuid4().hex
+    headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+        ).encode("latin-1")
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode("latin-1")
+    content_length = (
+        sum(len(header) + (end - start) + 2 for header, (start, end) in zip(headers, ranges))
+        + len(closing)
+    )
+
+    def body():
+        for header, (start, end) in zip(headers, ranges):
+            yield header
+            yield from read_range(start, end)
+            yield b"\r\n"
+        yield closing
+
+    return boundary, content_length, body()
+
+
+# ============ VALIDATORS ============
+
+def http_date(dt: datetime) -> str:
+    """Format a naive UTC datetime as an HTTP date."""
+    return format_datetime(dt.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _etag_list(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(headers, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since for a GET request."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        tags = _etag_list(if_none_match)
+        return "*" in tags or _opaque(etag) in (_opaque(tag) for tag in tags)
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        since = _parse_http_date(if_modified_since)
+        if since is not None:
+            # HTTP dates have one-second resolution
+            modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+            return modified <= since
+    return False
+
+
+def if_range_matches(headers, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Whether a Range header may be honoured given the request's If-Range."""
+    if_range = headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Strong comparison only
+        return etag is not None and not if_range.startswith("W/") and if_range == etag
+    since = _parse_http_date(if_range)
+    if since is None or last_modified is None:
+        return False
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) == since
+
+
+def accepts_encoding(headers, coding: str) -> bool:
+    """Whether Accept-Encoding allows `coding`, explicitly or through `*`."""
+    accepted = {}
+    for part in headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        key, _, value = params.partition("=")
+        if key.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    quality = accepted.get(coding, accepted.get("*", 0.0))
+    return quality > 0
+
+
+def _ascii_fallback(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return "".join("_" if char in '"\\' or not char.isprintable() else char for char in text)
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    """A Content-Disposition value for any file name (RFC 6266).
+
+    Header values must be latin-1, so the name goes in `filename*` as
+    percent-encoded UTF-8, with an ASCII approximation in `filename` for
+    clients that do not read the extended parameter.
+    """
+    stem, ext = posixpath.splitext(filename)
+    stem, ext = _ascii_fallback(stem), _ascii_fallback(ext)
+    fallback = (stem if stem.strip(" ._") else "download") + ext
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
@@ -0,0 +1,105 @@
+import re
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+# Item names are indexed as the lower-cased prefixes of each word, so a
+# typeahead query is an equality match on a multikey index instead of an
+# unanchored regex over every name.
+MAX_PREFIX_LENGTH = 16
+BACKFILL_BATCH_SIZE = 1000
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-cased words of letters and digits."""
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def name_search_keys(name: str) -> List[str]:
+    """All word prefixes of an item name, as stored in `search_keys`."""
+    keys = set()
+    for token in tokenize(name):
+        for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+            keys.add(token[:length])
+    return sorted(keys)
+
+
+def name_first_word_keys(name: str) -> List[str]:
+    """Prefixes of the first word of an item name, as stored in `search_first`.
+
+    Names whose first word matches the query rank highest, so searches
+    fetch those candidates first through this field.
+    """
+    tokens = tokenize(name)
+    if not tokens:
+        return []
+    first = tokens[0]
+    return [first[:length] for length in range(1, min(len(first), MAX_PREFIX_LENGTH) + 1)]
+
+
+def search_fields(name: str) -> dict:
+    """The indexed search fields of an item with this name."""
+    return {"search_keys": name_search_keys(name), "search_first": name_first_word_keys(name)}
+
+
+def query_keys(tokens: List[str]) -> List[str]:
+    """Index keys for a query, most selective (longest) first.
+
+    The planner bounds the index scan on the first key of an `$all` and
+    filters on the rest.
+    """
+    keys = {token[:MAX_PREFIX_LENGTH] for token in tokens}
+    return sorted(keys, key=lambda key: (-len(key), key))
+
+
+def score(name: str, query: str, tokens: List[str]) -> Optional[float]:
+    """Relevance of `name` for a query, or None if it does not actually match.
+
+    Exact names rank first, then names starting with the query, then names
+    whose first word matches; shorter names win ties.
+    """
+    name_tokens = tokenize(name)
+    # Keys are truncated, so confirm every query word prefixes a name word
+    if not all(any(word.startswith(token) for word in name_tokens) for token in tokens):
+        return None
+
+    folded = name.casefold()
+    query = query.strip().casefold()
+    if folded == query:
+        relevance = 100.0
+    elif folded.startswith(query):
+        relevance = 75.0
+    elif name_tokens and name_tokens[0].startswith(tokens[0]):
+        relevance = 50.0
+    else:
+        relevance = 25.0
+    # Prefer names where the query covers more of the name
+    return relevance + 10.0 * sum(map(len, tokens)) / max(len(folded), 1)
+
+
+def rank(docs: list, query: str, tokens: List[str], limit: int) -> list:
+    scored = []
+    for doc in docs:
+        relevance = score(doc["name"], query, tokens)
+        if relevance is not None:
+            scored.append((-relevance, doc["name"].casefold(), doc))
+    scored.sort(key=lambda entry: entry[:2])
+    return [doc for _, _, doc in scored[:limit]]
+
+
+async def backfill_search_keys(db):
+    """Index names of items created before search_keys (or search_first) existed."""
+    for collection in (db.folders, db.files):
+        while True:
+            docs = await collection.find(
+                {"search_first": {"$exists": False}},
+                {"name": 1}
+            ).limit(BACKFILL_BATCH_SIZE).to_list(BACKFILL_BATCH_SIZE)
+            if not docs:
+                break
+            await collection.bulk_write([
+                UpdateOne({"_id": doc["_id"]}, {"$set": search_fields(doc.get("name") or "")})
+                for doc in docs
+            ], ordered=False)
@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+from hierarchy import EMPTY_CONTENTS
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; without it the standard library encodes
+    orjson = None
+
+# List endpoints turn Mongo documents straight into the dicts their response
+# models describe and return them as a FastJSONResponse. A Response skips
+# FastAPI's per-row model validation and jsonable_encoder pass, while the
+# route's response_model still documents the shape in OpenAPI. Each row
+# function must stay in step with its model in models.py.
+
+# Only the fields the rows (and the listings' sort keys) use
+FILE_LIST_PROJECTION = {
+    "name": 1, "type": 1, "size": 1, "folder_id": 1, "owner_id": 1, "created_at": 1, "modified_at": 1,
+    "starred": 1, "trashed": 1, "last_opened": 1, "metadata.thumbnail_url": 1,
+}
+FOLDER_LIST_PROJECTION = {
+    "name": 1, "parent_id": 1, "owner_id": 1, "created_at": 1, "modified_at": 1,
+    "starred": 1, "trashed": 1, "contents": 1,
+}
+ACTIVITY_LIST_PROJECTION = {"type": 1, "item_id": 1, "description": 1, "timestamp": 1}
+COMMENT_LIST_PROJECTION = {"user_id": 1, "text": 1, "created_at": 1}
+SHARE_LIST_PROJECTION = {"user_id": 1, "permission": 1}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse for content that is already plain JSON types, encoded with orjson when installed."""
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+
+def format_datetime(dt):
+    if isinstance(dt, datetime):
+        return dt.isoformat() + 'Z'
+    return dt
+
+
+def _str_or_none(value) -> Optional[str]:
+    return str(value) if value else None
+
+
+def folder_row(folder: dict) -> dict:
+    """FolderResponse as a dict."""
+    contents = folder.get("contents", EMPTY_CONTENTS)
+    return {
+        "id": str(folder["_id"]),
+        "name": folder["name"],
+        "parentId": _str_or_none(folder.get("parent_id")),
+        "ownerId": str(folder["owner_id"]),
+        "created": format_datetime(folder["created_at"]),
+        "modified": format_datetime(folder["modified_at"]),
+        "starred": folder.get("starred", False),
+        "trashed": folder.get("trashed", False),
+        "size": contents["bytes"],
+        "itemCount": contents["files"] + contents["folders"],
+    }
+
+
+def file_row(file: dict) -> dict:
+    """FileResponse as a dict."""
+    file_id = str(file["_id"])
+    return {
+        "id": file_id,
+        "name": file["name"],
+        "type": file["type"],
+        "size": file["size"],
+        "folderId": _str_or_none(file.get("folder_id")),
+        "ownerId": str(file["owner_id"]),
+        "created": format_datetime(file["created_at"]),
+        "modified": format_datetime(file["modified_at"]),
+        "starred": file.get("starred", False),
+        "trashed": file.get("trashed", False),
+        "thumbnail": file.get("metadata", {}).get("thumbnail_url"),
+        "lastOpened": format_datetime(file.get("last_opened")) if file.get("last_opened") else None,
+        "url": f"/api/files/{file_id}/download",
+    }
+
+
+def activity_row(activity: dict, user_id: str) -> dict:
+    """ActivityResponse as a dict."""
+    return {
+        "id": str(activity["_id"]),
+        "type": activity["type"],
+        "userId": user_id,
+        "fileId": _str_or_none(activity.get("item_id")),
+        "description": activity["description"],
+        "timestamp": format_datetime(activity["timestamp"]),
+    }
+
+
+def comment_row(comment: dict, file_id: str, user: Optional[dict]) -> dict:
+    """CommentResponse as a dict."""
+    return {
+        "id": str(comment["_id"]),
+        "fileId": file_id,
+        "userId": str(comment["user_id"]),
+        "userName": user["name"] if user else "Unknown",
+        "text": comment["text"],
+        "timestamp": format_datetime(comment["created_at"]),
+    }
+
+
+def share_row(share: dict, user: dict) -> dict:
+    """ShareWithUser as a dict."""
+    return {
+        "id": str(user["_id"]),
+        "name": user["name"],
+        "email": user["email"],
+        "permission": share["permission"],
+    }
@@ -1,19 +1,55 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Security
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, ASCENDING, DESCENDING, UpdateOne, UpdateMany
 import os
 import logging
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
 from typing import Optional, List
+import asyncio
 import base64
-import io
+import hashlib
+import hmac
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
 
 from models import *
-from auth import hash_password, verify_password, create_access_token, get_current_user
+from auth import (
+    hash_password_async, verify_and_update_password, password_hasher, create_access_token, get_current_user,
+    security, token_cache, revoke_token, load_revoked_tokens
+)
+from storage import BlobStore, BlobNotFound, is_compressible
+from archives import ZipStream, safe_name
+from serializers import (
+    FastJSONResponse, format_datetime, folder_row, file_row, activity_row, comment_row, share_row,
+    FILE_LIST_PROJECTION, FOLDER_LIST_PROJECTION, ACTIVITY_LIST_PROJECTION, COMMENT_LIST_PROJECTION, SHARE_LIST_PROJECTION
+)
+from metrics import process_rss
+from ranges import (
+    RangeNotSatisfiable, parse_range, multipart_byteranges, http_date, is_not_modified, if_range_matches,
+    accepts_encoding, content_disposition
+)
+from pagination import InvalidCursor, encode_cursor, decode_cursor, cursor_after, keyset_filter, sort_value
+from indexes import ensure_indexes, ensure_ttl_index
+from search import MAX_PREFIX_LENGTH, tokenize, search_fields, query_keys, rank, backfill_search_keys
+from loaders import UserLoader
+from permissions import AclCache, SHARE_ROLES, role_at_least
+from previews import charset_of, decode_text_window
+from thumbnails import ThumbnailWorker, ThumbnailError, thumbnails_available, rendition_name, pick_size, thumbnail_format
+from activity import ActivityWriter, rollup_activities
+from hierarchy import (
+    child_ancestors, subtree_filter, rebase_ancestors, backfill_ancestors,
+    EMPTY_CONTENTS, contents_changes, file_contents_changes, folder_contents_changes, counted_by,
+    accumulate_contents, apply_contents, propagate_contents, backfill_folder_contents
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -23,6 +59,18 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Blob storage for file contents; text-like content is gzipped at this level (0 turns it off)
+BLOB_COMPRESSION_LEVEL = int(os.environ.get('BLOB_COMPRESSION_LEVEL', 1))
+blob_store = BlobStore(os.environ.get('STORAGE_DIR', ROOT_DIR / 'storage'), BLOB_COMPRESSION_LEVEL)
+
+# Activity events are buffered and written in batches off the request path
+activity_writer = ActivityWriter(
+    db.activities,
+    max_queue=int(os.environ.get('ACTIVITY_QUEUE_SIZE', 10000)),
+    batch_size=int(os.environ.get('ACTIVITY_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 1.0))
+)
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -43,10 +91,233 @@ def serialize_doc(doc):
         del doc["_id"]
     return doc
 
-def format_datetime(dt):
-    if isinstance(dt, datetime):
-        return dt.isoformat() + 'Z'
-    return dt
+def iter_file_content(file_doc, start: int = 0, end: Optional[int] = None):
+    """Iterate over the stored bytes of a file document, optionally a [start, end) slice."""
+    blob_id = file_doc.get("blob_id")
+    if blob_id:
+        return blob_store.iter_range(blob_id, start, end)
+    
+    # Documents created before the blob store kept small files inline
+    storage_data = file_doc["metadata"].get("storage_data")
+    if storage_data:
+        return iter([base64.b64decode(storage_data)[start:end]])
+    raise BlobNotFound(str(file_doc["_id"]))
+
+def file_content_size(file_doc) -> int:
+    blob_id = file_doc.get("blob_id")
+    if blob_id:
+        return blob_store.size(blob_id)
+    if file_doc["metadata"].get("storage_data"):
+        return file_doc["size"]
+    raise BlobNotFound(str(file_doc["_id"]))
+
+# ============ BLOB REFERENCES ============
+
+# Identical content is stored once; each blob document counts the files that
+# reference it. Taking a reference and reclaiming a blob both hold the blob's
+# lock so the collector cannot delete content an upload has just matched.
+# Locks are in-process, which matches the single uvicorn worker we run.
+BLOB_LOCK_STRIPES = 64
+BLOB_GC_INTERVAL = int(os.environ.get('BLOB_GC_INTERVAL', 300))  # seconds
+BLOB_GC_GRACE = timedelta(seconds=int(os.environ.get('BLOB_GC_GRACE', 3600)))
+BLOB_GC_BATCH_SIZE = 500
+
+blob_locks = [asyncio.Lock() for _ in range(BLOB_LOCK_STRIPES)]
+
+def blob_lock(blob_id: str) -> asyncio.Lock:
+    return blob_locks[int(blob_id[:8], 16) % BLOB_LOCK_STRIPES]
+
+async def commit_blob(writer) -> str:
+    """Publish a written blob (or reuse an identical one) and take a reference to it."""
+    blob_id = await run_in_threadpool(writer.finish)
+    async with blob_lock(blob_id):
+        try:
+            previous = await db.blobs.find_one_and_update(
+                {"_id": blob_id},
+                {
+                    "$inc": {"refcount": 1},
+                    "$unset": {"zero_since": ""},
+                    "$setOnInsert": {"size": writer.size, "stored_size": writer.stored_size, "created_at": datetime.utcnow()}
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except BaseException:
+            await run_in_threadpool(writer.abort)
+            raise
+        try:
+            await run_in_threadpool(writer.commit)
+        except BaseException:
+            await run_in_threadpool(writer.abort)
+            await release_blob(blob_id)
+            raise
+    
+    if previous is None:
+        await db.blob_stats.update_one(
+            {"_id": "physical"},
+            {"$inc": {"bytes": writer.stored_size, "count": 1}},
+            upsert=True
+        )
+    return blob_id
+
+async def release_blob(blob_id: str):
+    """Drop a reference; unreferenced blobs are reclaimed later by collect_blobs."""
+    blob = await db.blobs.find_one_and_update(
+        {"_id": blob_id},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if blob and blob["refcount"] <= 0:
+        await db.blobs.update_one(
+            {"_id": blob_id, "refcount": {"$lte": 0}},
+            {"$set": {"zero_since": datetime.utcnow()}}
+        )
+
+async def release_blobs(references: dict):
+    """Drop many references at once, given {blob_id: number of references}."""
+    if not references:
+        return
+    blob_ids = list(references)
+    for start in range(0, len(blob_ids), BLOB_GC_BATCH_SIZE):
+        batch = blob_ids[start:start + BLOB_GC_BATCH_SIZE]
+        await db.blobs.bulk_write(
+            [UpdateOne({"_id": blob_id}, {"$inc": {"refcount": -references[blob_id]}}) for blob_id in batch],
+            ordered=False
+        )
+        await db.blobs.update_many(
+            {"_id": {"$in": batch}, "refcount": {"$lte": 0}},
+            {"$set": {"zero_since": datetime.utcnow()}}
+        )
+
+async def collect_blob_batch() -> int:
+    """Delete up to BLOB_GC_BATCH_SIZE blobs that have been unreferenced for BLOB_GC_GRACE."""
+    candidates = await db.blobs.find(
+        {"refcount": {"$lte": 0}, "zero_since": {"$lt": datetime.utcnow() - BLOB_GC_GRACE}},
+        {"_id": 1}
+    ).limit(BLOB_GC_BATCH_SIZE).to_list(BLOB_GC_BATCH_SIZE)
+    
+    reclaimed_count = reclaimed_bytes = 0
+    for candidate in candidates:
+        async with blob_lock(candidate["_id"]):
+            blob = await db.blobs.find_one_and_delete({"_id": candidate["_id"], "refcount": {"$lte": 0}})
+            if not blob:
+                continue
+            await run_in_threadpool(blob_store.delete, blob["_id"])
+        reclaimed_count += 1
+        reclaimed_bytes += blob.get("stored_size", blob["size"])
+    
+    if reclaimed_count:
+        await db.blob_stats.update_one(
+            {"_id": "physical"},
+            {"$inc": {"bytes": -reclaimed_bytes, "count": -reclaimed_count}}
+        )
+        logger.info("Reclaimed %d unreferenced blobs (%d bytes)", reclaimed_count, reclaimed_bytes)
+    return len(candidates)
+
+async def collect_blobs():
+    while True:
+        try:
+            while await collect_blob_batch() == BLOB_GC_BATCH_SIZE:
+                pass
+        except Exception:
+            logger.exception("Blob collection failed")
+        await asyncio.sleep(BLOB_GC_INTERVAL)
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # 1MB
+
+async def store_upload(file: UploadFile):
+    """Stream an upload into the blob store one chunk at a time.
+    
+    Returns (blob_id, size). Only one chunk is held in memory at a time, so
+    memory stays flat regardless of the size of the upload.
+    """
+    started = time.monotonic()
+    rss_start = rss_peak = process_rss()
+    
+    writer = await run_in_threadpool(blob_store.writer, file.content_type)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(writer.write, chunk)
+            rss_peak = max(rss_peak, process_rss())
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    blob_id = await commit_blob(writer)
+    
+    logger.info(
+        "Stored upload %s: %d bytes (%d on disk) in %.2fs, peak RSS %.1f MiB (%+.1f MiB)",
+        file.filename, writer.size, writer.stored_size, time.monotonic() - started,
+        rss_peak / 2**20, (rss_peak - rss_start) / 2**20
+    )
+    return blob_id, writer.size
+
+async def get_parent_folder(folder_id: Optional[str], user_id: str) -> Optional[dict]:
+    """The folder items are being created in or moved to; None for the root of the drive."""
+    if not folder_id:
+        return None
+    folder = None
+    if ObjectId.is_valid(folder_id):
+        folder = await db.folders.find_one(
+            {"_id": ObjectId(folder_id), "owner_id": ObjectId(user_id)},
+            {"ancestors": 1, "trashed": 1}
+        )
+    if not folder:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    if folder.get("trashed"):
+        raise HTTPException(status_code=400, detail="Folder is in trash")
+    return folder
+
+# An item id may name a file or a folder. Both collections are searched in
+# one $unionWith aggregation (an _id lookup on each side), so resolving an
+# id costs one round trip whichever kind it turns out to be.
+ITEM_COLLECTIONS = {"file": "files", "folder": "folders"}
+ITEM_PROJECTION = {"search_keys": 0, "search_first": 0, "metadata.storage_data": 0}
+
+async def find_items(query: dict, projection: Optional[dict] = ITEM_PROJECTION, limit: int = 0) -> list:
+    """Files and folders matching `query`, each tagged with its `kind`."""
+    def branch(kind):
+        return [{"$match": query}] + ([{"$project": projection}] if projection else []) + [{"$set": {"kind": kind}}]
+    
+    pipeline = branch("file") + [{"$unionWith": {"coll": "folders", "pipeline": branch("folder")}}]
+    if limit:
+        pipeline.append({"$limit": limit})
+    return await db.files.aggregate(pipeline).to_list(limit or None)
+
+async def resolve_item(item_id: str, user_id: str, required: str = "owner"):
+    """(collection name, document) for a file or folder the user holds `required` access to."""
+    if not ObjectId.is_valid(item_id):
+        raise HTTPException(status_code=404, detail="Item not found")
+    items = await find_items({"_id": ObjectId(item_id)}, limit=1)
+    if not items:
+        raise HTTPException(status_code=404, detail="Item not found")
+    item = items[0]
+    collection = ITEM_COLLECTIONS[item.pop("kind")]
+    await authorize(item, user_id, required)
+    return collection, item
+
+# ============ PERMISSIONS ============
+
+# Every route authorizes through acl_cache: the owner has every right, other
+# users get the strongest share on the item or any folder above it.
+ACL_CACHE_SIZE = int(os.environ.get('ACL_CACHE_SIZE', 10000))
+
+acl_cache = AclCache(db, ACL_CACHE_SIZE)
+
+async def authorize(item, user_id: str, required: str) -> str:
+    """The user's role on an item; 404 without any access, 403 below `required`."""
+    role = await acl_cache.role(item, ObjectId(user_id))
+    if role is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not role_at_least(role, required):
+        raise HTTPException(status_code=403, detail=f"Requires {required} access")
+    return role
+
+def get_user_loader() -> UserLoader:
+    """Per-request loader that batches user lookups into one query."""
+    return UserLoader(db)
 
 # ============ HEALTH CHECK ROUTE ============
 
@@ -55,6 +326,29 @@ async def health_check():
     """Health check endpoint for Docker"""
     return {"status": "ok", "message": "Google Drive Clone API is running"}
 
+# Metrics describe the whole process, not one user, so they are for operators
+# only: requests must carry METRICS_TOKEN as their bearer token, and the
+# endpoint does not exist while it is unset.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+async def require_metrics_token(credentials: HTTPAuthorizationCredentials = Security(security)):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid metrics token")
+
+@api_router.get("/metrics", dependencies=[Depends(require_metrics_token)])
+async def get_metrics():
+    """In-process pipeline metrics"""
+    return {
+        "activity_writer": activity_writer.stats(),
+        "password_hasher": password_hasher.stats(),
+        "token_cache": token_cache.stats(),
+        "acl_cache": acl_cache.stats(),
+        "thumbnails": thumbnail_worker.stats(),
+        "process": {"rss_bytes": process_rss()}
+    }
+
 # ============ AUTHENTICATION ROUTES ============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -68,7 +362,7 @@ async def register(user_data: UserCreate):
     user_doc = {
         "email": user_data.email,
         "name": user_data.name,
-        "password_hash": hash_password(user_data.password),
+        "password_hash": await hash_password_async(user_data.password),
         "created_at": datetime.utcnow(),
         "storage_used": 0
     }
@@ -86,8 +380,15 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password_hash"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = await verify_and_update_password(credentials.password, user["password_hash"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    # Upgrade hashes made with an outdated cost factor
+    if new_hash:
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
     
     user_id = str(user["_id"])
     token = create_access_token({"sub": user_id})
@@ -105,13 +406,31 @@ async def get_me(user_id: str = Depends(get_current_user)):
     
     return UserResponse(id=str(user["_id"]), email=user["email"], name=user["name"])
 
+@api_router.post("/auth/logout")
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Security(security),
+    user_id: str = Depends(get_current_user)
+):
+    digest, expires_at = revoke_token(credentials.credentials)
+    # Persisted so the revocation survives restarts; the TTL index drops it once the token expires
+    await db.revoked_tokens.update_one(
+        {"_id": digest},
+        {"$setOnInsert": {"user_id": ObjectId(user_id), "expires_at": expires_at}},
+        upsert=True
+    )
+    return {"message": "Logged out"}
+
 # ============ FOLDER ROUTES ============
 
 @api_router.post("/folders", response_model=FolderResponse)
 async def create_folder(folder_data: FolderCreate, user_id: str = Depends(get_current_user)):
+    parent = await get_parent_folder(folder_data.parentId, user_id)
     folder_doc = {
         "name": folder_data.name,
-        "parent_id": ObjectId(folder_data.parentId) if folder_data.parentId else None,
+        **search_fields(folder_data.name),
+        "parent_id": parent["_id"] if parent else None,
+        "ancestors": child_ancestors(parent),
+        "contents": dict(EMPTY_CONTENTS),
         "owner_id": ObjectId(user_id),
         "created_at": datetime.utcnow(),
         "modified_at": datetime.utcnow(),
@@ -119,6 +438,8 @@ async def create_folder(folder_data: FolderCreate, user_id: str = Depends(get_cu
         "trashed": False
     }
     result = await db.folders.insert_one(folder_doc)
+    await propagate_contents(db, folder_doc["ancestors"], contents_changes(1, folders=1))
+    invalidate_folder_tree(user_id)
     
     # Log activity
     await log_activity(user_id, "upload", str(result.inserted_id), f"Created folder {folder_data.name}")
@@ -126,7 +447,7 @@ async def create_folder(folder_data: FolderCreate, user_id: str = Depends(get_cu
     return FolderResponse(
         id=str(result.inserted_id),
         name=folder_data.name,
-        parentId=folder_data.parentId,
+        parentId=str(parent["_id"]) if parent else None,
         ownerId=user_id,
         created=format_datetime(folder_doc["created_at"]),
         modified=format_datetime(folder_doc["modified_at"]),
@@ -134,6 +455,87 @@ async def create_folder(folder_data: FolderCreate, user_id: str = Depends(get_cu
         trashed=False
     )
 
+@api_router.get("/folders/{folder_id}/path", response_model=List[FolderNode])
+async def get_folder_path(folder_id: str, user_id: str = Depends(get_current_user)):
+    """Breadcrumb for a folder, root first, resolved in one query through its ancestors."""
+    if not ObjectId.is_valid(folder_id):
+        raise HTTPException(status_code=404, detail="Folder not found")
+    found = await db.folders.aggregate([
+        {"$match": {"_id": ObjectId(folder_id)}},
+        {"$lookup": {
+            "from": "folders",
+            "localField": "ancestors",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"name": 1, "parent_id": 1}}],
+            "as": "chain"
+        }},
+        {"$project": {"name": 1, "parent_id": 1, "ancestors": 1, "owner_id": 1, "trashed": 1, "chain": 1}}
+    ]).to_list(1)
+    if not found:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    
+    folder = found[0]
+    role = await authorize(folder, user_id, "viewer")
+    # $lookup does not keep the order of the ancestors array
+    chain = {link["_id"]: link for link in folder["chain"]}
+    path = [chain[ancestor] for ancestor in folder.get("ancestors", []) if ancestor in chain] + [folder]
+    if role != "owner":
+        # Start at the highest folder actually shared with the user
+        grants = await acl_cache.grants(ObjectId(user_id))
+        path = path[next((i for i, link in enumerate(path) if link["_id"] in grants), 0):]
+    return [
+        FolderNode(
+            id=str(link["_id"]),
+            name=link["name"],
+            parentId=str(link["parent_id"]) if link.get("parent_id") else None
+        )
+        for link in path
+    ]
+
+# The sidebar skeleton of every live folder a user owns, kept as ready-to-send
+# JSON. Any folder mutation drops the owner's entry; the generation counter
+# stops a tree built concurrently with a mutation from being cached.
+FOLDER_TREE_CACHE_SIZE = int(os.environ.get('FOLDER_TREE_CACHE_SIZE', 1000))
+
+folder_tree_cache = OrderedDict()
+folder_tree_generation = 0
+
+def invalidate_folder_tree(user_id):
+    global folder_tree_generation
+    folder_tree_generation += 1
+    folder_tree_cache.pop(str(user_id), None)
+
+@api_router.get("/folders/tree", response_model=FolderTreeResponse)
+async def get_folder_tree(request: Request, user_id: str = Depends(get_current_user)):
+    cached = folder_tree_cache.get(user_id)
+    if cached is not None:
+        folder_tree_cache.move_to_end(user_id)
+    else:
+        generation = folder_tree_generation
+        folders = await db.folders.find(
+            {"owner_id": ObjectId(user_id), "trashed": False},
+            {"name": 1, "parent_id": 1}
+        ).to_list(None)
+        body = FolderTreeResponse(folders=[
+            FolderNode(
+                id=str(folder["_id"]),
+                name=folder["name"],
+                parentId=str(folder["parent_id"]) if folder.get("parent_id") else None
+            )
+            for folder in folders
+        ]).model_dump_json().encode()
+        cached = (f'"{hashlib.sha1(body).hexdigest()}"', body)
+        if generation == folder_tree_generation:
+            folder_tree_cache[user_id] = cached
+            while len(folder_tree_cache) > FOLDER_TREE_CACHE_SIZE:
+                folder_tree_cache.popitem(last=False)
+    
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if is_not_modified(request.headers, etag, None):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # ============ FILE ROUTES ============
 
 @api_router.post("/files/upload", response_model=FileResponse)
@@ -142,20 +544,23 @@ async def upload_file(
     folderId: Optional[str] = Form(None),
     user_id: str = Depends(get_current_user)
 ):
-    # Read file content
-    content = await file.read()
-    file_size = len(content)
+    folder = await get_parent_folder(folderId, user_id)
     
-    # For simulation, store small files as base64, larger files as metadata only
-    storage_data = None
-    if file_size < 1024 * 1024:  # 1MB
-        storage_data = base64.b64encode(content).decode('utf-8')
+    # Stream file content into the blob store
+    blob_id, file_size = await store_upload(file)
     
+    return await create_file_record(user_id, file.filename, file.content_type, file_size, blob_id, folder)
+
+async def create_file_record(user_id: str, name: str, content_type: str, file_size: int, blob_id: str, folder: Optional[dict]) -> FileResponse:
+    """Create the files document for a stored blob and account for it."""
     file_doc = {
-        "name": file.filename,
-        "type": file.content_type,
+        "name": name,
+        **search_fields(name),
+        "type": content_type,
         "size": file_size,
-        "folder_id": ObjectId(folderId) if folderId else None,
+        "blob_id": blob_id,
+        "folder_id": folder["_id"] if folder else None,
+        "ancestors": child_ancestors(folder),
         "owner_id": ObjectId(user_id),
         "created_at": datetime.utcnow(),
         "modified_at": datetime.utcnow(),
@@ -163,8 +568,7 @@ async def upload_file(
         "starred": False,
         "trashed": False,
         "metadata": {
-            "original_filename": file.filename,
-            "storage_data": storage_data,
+            "original_filename": name,
             "thumbnail_url": None
         }
     }
@@ -172,21 +576,25 @@ async def upload_file(
     result = await db.files.insert_one(file_doc)
     file_id = str(result.inserted_id)
     
-    # Update user storage
+    # Update user storage and the folder totals above the file
     await db.users.update_one(
         {"_id": ObjectId(user_id)},
-        {"$inc": {"storage_used": file_size}}
+        {"$inc": storage_changes(file_doc, 1)}
     )
+    await propagate_contents(db, file_doc["ancestors"], file_contents_changes(file_doc, 1))
+    
+    if (content_type or "").startswith("image/"):
+        thumbnail_worker.submit(result.inserted_id, blob_id)
     
     # Log activity
-    await log_activity(user_id, "upload", file_id, f"Uploaded {file.filename}")
+    await log_activity(user_id, "upload", file_id, f"Uploaded {name}")
     
     return FileResponse(
         id=file_id,
-        name=file.filename,
-        type=file.content_type,
+        name=name,
+        type=content_type,
         size=file_size,
-        folderId=folderId,
+        folderId=str(folder["_id"]) if folder else None,
         ownerId=user_id,
         created=format_datetime(file_doc["created_at"]),
         modified=format_datetime(file_doc["modified_at"]),
@@ -198,16 +606,11 @@ async def upload_file(
     )
 
 @api_router.get("/files/{file_id}/download")
-async def download_file(file_id: str, user_id: str = Depends(get_current_user)):
+async def download_file(file_id: str, request: Request, user_id: str = Depends(get_current_user)):
     file_doc = await db.files.find_one({"_id": ObjectId(file_id)})
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
-    
-    # Check permissions
-    if str(file_doc["owner_id"]) != user_id:
-        share = await db.shares.find_one({"item_id": ObjectId(file_id), "user_id": ObjectId(user_id)})
-        if not share:
-            raise HTTPException(status_code=403, detail="Access denied")
+    await authorize(file_doc, user_id, "viewer")
     
     # Update last opened
     await db.files.update_one(
@@ -215,48 +618,459 @@ async def download_file(file_id: str, user_id: str = Depends(get_current_user)):
         {"$set": {"last_opened": datetime.utcnow()}}
     )
     
-    # Return simulated content
-    storage_data = file_doc["metadata"].get("storage_data")
-    if storage_data:
-        content = base64.b64decode(storage_data)
-    else:
-        # Generate mock content for larger files
-        content = f"Simulated content for {file_doc['name']}\nSize: {file_doc['size']} bytes\nThis is a mock file in the training environment.".encode('utf-8')
+    try:
+        size = file_content_size(file_doc)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="File content not found")
+    
+    # Blobs are content-addressed, so the digest is a strong validator
+    blob_id = file_doc.get("blob_id")
+    etag = f'"{blob_id}"' if blob_id else None
+    # Compressed blobs go out as stored to clients that take gzip. Ranges
+    # always address the original bytes, so they are decoded instead.
+    compressed = bool(blob_id) and blob_store.is_compressed(blob_id)
+    send_gzip = compressed and "range" not in request.headers and accepts_encoding(request.headers, "gzip")
+    if send_gzip:
+        etag = f'"{blob_id}-gzip"'
+    last_modified = file_doc["modified_at"]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Last-Modified": http_date(last_modified)
+    }
+    if etag:
+        headers["ETag"] = etag
+    if compressed:
+        headers["Vary"] = "Accept-Encoding"
+    
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    
+    headers["Content-Disposition"] = content_disposition(file_doc["name"])
+    
+    if send_gzip:
+        try:
+            headers["Content-Length"] = str(blob_store.stored_size(blob_id))
+        except BlobNotFound:
+            raise HTTPException(status_code=404, detail="File content not found")
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(blob_store.iter_compressed(blob_id), media_type=file_doc["type"], headers=headers)
+    
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header and if_range_matches(request.headers, etag, last_modified):
+        try:
+            ranges = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_file_content(file_doc), media_type=file_doc["type"], headers=headers)
+    
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        headers["Content-Length"] = str(end - start)
+        return StreamingResponse(
+            iter_file_content(file_doc, start, end),
+            status_code=206,
+            media_type=file_doc["type"],
+            headers=headers
+        )
     
+    boundary, content_length, body = multipart_byteranges(
+        ranges, size, file_doc["type"],
+        lambda start, end: iter_file_content(file_doc, start, end)
+    )
+    headers["Content-Length"] = str(content_length)
     return StreamingResponse(
-        io.BytesIO(content),
-        media_type=file_doc["type"],
-        headers={"Content-Disposition": f"attachment; filename={file_doc['name']}"}
+        body,
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers
     )
 
+# Text previews read one bounded window straight from storage, so a
+# multi-GB log costs no more than a small file. `offset`/`length` page
+# through the rest; nextOffset is where the following page starts.
+TEXT_PREVIEW_BYTES = int(os.environ.get('TEXT_PREVIEW_BYTES', 64 * 1024))
+TEXT_PREVIEW_MAX_BYTES = int(os.environ.get('TEXT_PREVIEW_MAX_BYTES', 1024 * 1024))
+
 @api_router.get("/files/{file_id}/preview")
-async def preview_file(file_id: str, user_id: str = Depends(get_current_user)):
+async def preview_file(
+    file_id: str,
+    offset: int = Query(0, ge=0),
+    length: Optional[int] = Query(None, ge=64),
+    user_id: str = Depends(get_current_user)
+):
     file_doc = await db.files.find_one({"_id": ObjectId(file_id)})
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
+    await authorize(file_doc, user_id, "viewer")
     
     # Return preview data
-    storage_data = file_doc["metadata"].get("storage_data")
-    if storage_data and file_doc["type"].startswith("image/"):
-        return {"preview": f"data:{file_doc['type']};base64,{storage_data}"}
-    elif file_doc["type"].startswith("text/"):
-        if storage_data:
-            content = base64.b64decode(storage_data).decode('utf-8')
-        else:
-            content = "Preview not available for this file."
-        return {"preview": content, "type": "text"}
-    else:
-        return {"preview": None, "message": "Preview not available"}
+    if file_doc["type"].startswith("text/"):
+        length = min(length or TEXT_PREVIEW_BYTES, TEXT_PREVIEW_MAX_BYTES)
+        try:
+            size = file_content_size(file_doc)
+            text, next_offset = await run_in_threadpool(
+                lambda: decode_text_window(
+                    iter_file_content(file_doc, offset, offset + length),
+                    offset, size, charset_of(file_doc["type"])
+                )
+            )
+        except BlobNotFound:
+            return {"preview": "Preview not available for this file.", "type": "text"}
+        return {
+            "preview": text,
+            "type": "text",
+            "offset": offset,
+            "nextOffset": next_offset,
+            "size": size,
+            "truncated": next_offset is not None
+        }
+    
+    # Images preview through their largest thumbnail rather than the original
+    if file_doc["type"].startswith("image/") and file_doc.get("blob_id") and thumbnails_available():
+        return {"preview": f"{thumbnail_url(file_doc['_id'])}?size={max(THUMBNAIL_SIZES)}", "type": "image"}
+    return {"preview": None, "message": "Preview not available"}
+
+# ============ THUMBNAILS ============
+
+# Images get fixed-size renditions rendered in the background after upload
+# and stored beside their blob. FileResponse.thumbnail points at the
+# endpoint once they exist; missing ones are rendered on first request.
+THUMBNAIL_SIZES = tuple(int(size) for size in os.environ.get('THUMBNAIL_SIZES', '128,512,1024').split(','))
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+THUMBNAIL_QUEUE_SIZE = int(os.environ.get('THUMBNAIL_QUEUE_SIZE', 1000))
+THUMBNAIL_MAX_PIXELS = int(os.environ.get('THUMBNAIL_MAX_PIXELS', 50_000_000))
+
+def thumbnail_url(file_id) -> str:
+    return f"/api/files/{file_id}/thumbnail"
+
+async def mark_thumbnail(file_id):
+    await db.files.update_one({"_id": file_id}, {"$set": {"metadata.thumbnail_url": thumbnail_url(file_id)}})
+
+thumbnail_worker = ThumbnailWorker(
+    blob_store,
+    THUMBNAIL_SIZES,
+    mark_thumbnail,
+    workers=THUMBNAIL_WORKERS,
+    max_queue=THUMBNAIL_QUEUE_SIZE,
+    max_pixels=THUMBNAIL_MAX_PIXELS
+)
+
+@api_router.get("/files/{file_id}/thumbnail")
+async def get_thumbnail(
+    file_id: str,
+    request: Request,
+    size: int = Query(THUMBNAIL_SIZES[0], ge=1),
+    user_id: str = Depends(get_current_user)
+):
+    if not ObjectId.is_valid(file_id):
+        raise HTTPException(status_code=404, detail="File not found")
+    file_doc = await db.files.find_one(
+        {"_id": ObjectId(file_id)},
+        {"owner_id": 1, "ancestors": 1, "trashed": 1, "type": 1, "blob_id": 1, "metadata.thumbnail_url": 1}
+    )
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    await authorize(file_doc, user_id, "viewer")
+    if not thumbnails_available() or not (file_doc.get("type") or "").startswith("image/") or not file_doc.get("blob_id"):
+        raise HTTPException(status_code=404, detail="No thumbnail for this file")
+    
+    size = pick_size(THUMBNAIL_SIZES, size)
+    blob_id = file_doc["blob_id"]
+    # Renditions are derived from immutable content, so they never change for a given blob
+    etag = f'"{blob_id}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=604800, immutable"}
+    if is_not_modified(request.headers, etag, None):
+        return Response(status_code=304, headers=headers)
+    
+    path = blob_store.rendition_path(blob_id, rendition_name(size))
+    if not path.exists():
+        try:
+            await thumbnail_worker.render(blob_id)
+        except ThumbnailError:
+            raise HTTPException(status_code=404, detail="No thumbnail for this file")
+        if not file_doc.get("metadata", {}).get("thumbnail_url"):
+            await mark_thumbnail(file_doc["_id"])
+    
+    try:
+        content = await run_in_threadpool(path.read_bytes)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="No thumbnail for this file")
+    return Response(content=content, media_type=f"image/{thumbnail_format()}", headers=headers)
+
+# ============ UPLOAD SESSION ROUTES ============
+
+UPLOAD_SESSION_CHUNK_SIZE = int(os.environ.get('UPLOAD_SESSION_CHUNK_SIZE', 8 * 1024 * 1024))  # 8MB
+UPLOAD_SESSION_MIN_CHUNK_SIZE = 256 * 1024  # 256KB
+UPLOAD_SESSION_MAX_CHUNK_SIZE = 64 * 1024 * 1024  # 64MB
+UPLOAD_SESSION_TTL = timedelta(hours=int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24)))
+UPLOAD_SESSION_GC_INTERVAL = int(os.environ.get('UPLOAD_SESSION_GC_INTERVAL', 600))  # seconds
+
+def format_upload_session(session) -> UploadSessionResponse:
+    received = sorted(session["received"])
+    last_index = session["total_chunks"] - 1
+    received_bytes = sum(
+        session["size"] - last_index * session["chunk_size"] if index == last_index else session["chunk_size"]
+        for index in received
+    )
+    return UploadSessionResponse(
+        id=str(session["_id"]),
+        name=session["name"],
+        size=session["size"],
+        chunkSize=session["chunk_size"],
+        totalChunks=session["total_chunks"],
+        receivedChunks=received,
+        receivedBytes=received_bytes,
+        expiresAt=format_datetime(session["expires_at"])
+    )
+
+async def get_upload_session(session_id: str, user_id: str):
+    session = None
+    if ObjectId.is_valid(session_id):
+        session = await db.upload_sessions.find_one({"_id": ObjectId(session_id), "owner_id": ObjectId(user_id)})
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+@api_router.post("/uploads", response_model=UploadSessionResponse)
+async def create_upload_session(session_data: UploadSessionCreate, user_id: str = Depends(get_current_user)):
+    chunk_size = session_data.chunkSize or UPLOAD_SESSION_CHUNK_SIZE
+    if not UPLOAD_SESSION_MIN_CHUNK_SIZE <= chunk_size <= UPLOAD_SESSION_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail="Chunk size out of range")
+    if session_data.size < 0:
+        raise HTTPException(status_code=400, detail="Invalid file size")
+    await get_parent_folder(session_data.folderId, user_id)
+    
+    session_doc = {
+        "owner_id": ObjectId(user_id),
+        "name": session_data.name,
+        "type": session_data.type,
+        "size": session_data.size,
+        "folder_id": session_data.folderId,
+        "chunk_size": chunk_size,
+        "total_chunks": max(1, math.ceil(session_data.size / chunk_size)),
+        "received": [],
+        "status": "open",
+        "created_at": datetime.utcnow(),
+        "expires_at": datetime.utcnow() + UPLOAD_SESSION_TTL
+    }
+    result = await db.upload_sessions.insert_one(session_doc)
+    session_doc["_id"] = result.inserted_id
+    
+    return format_upload_session(session_doc)
+
+@api_router.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session_status(session_id: str, user_id: str = Depends(get_current_user)):
+    session = await get_upload_session(session_id, user_id)
+    return format_upload_session(session)
+
+@api_router.put("/uploads/{session_id}/chunks/{index}")
+async def upload_session_chunk(session_id: str, index: int, request: Request, user_id: str = Depends(get_current_user)):
+    session = await get_upload_session(session_id, user_id)
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail="Upload session is already being finalized")
+    
+    last_index = session["total_chunks"] - 1
+    if not 0 <= index <= last_index:
+        raise HTTPException(status_code=400, detail="Chunk index out of range")
+    expected_size = session["size"] - last_index * session["chunk_size"] if index == last_index else session["chunk_size"]
+    
+    # Stream the request body straight to disk
+    writer = await run_in_threadpool(blob_store.part_writer, session_id, index)
+    try:
+        async for data in request.stream():
+            if writer.size + len(data) > expected_size:
+                raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected_size} bytes")
+            await run_in_threadpool(writer.write, data)
+        if writer.size != expected_size:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected_size} bytes")
+        await run_in_threadpool(writer.commit)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    
+    await db.upload_sessions.update_one(
+        {"_id": session["_id"]},
+        {
+            "$addToSet": {"received": index},
+            "$set": {"expires_at": datetime.utcnow() + UPLOAD_SESSION_TTL}
+        }
+    )
+    
+    return {"success": True, "index": index, "size": expected_size}
+
+@api_router.post("/uploads/{session_id}/complete", response_model=FileResponse)
+async def complete_upload_session(session_id: str, user_id: str = Depends(get_current_user)):
+    session = await get_upload_session(session_id, user_id)
+    missing = set(range(session["total_chunks"])) - set(session["received"])
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing chunks: {sorted(missing)[:20]}")
+    # The target folder may have been trashed or deleted while chunks were arriving
+    folder = await get_parent_folder(session["folder_id"], user_id)
+    
+    # Claim the session so concurrent completes cannot finalize it twice
+    claimed = await db.upload_sessions.find_one_and_update(
+        {"_id": session["_id"], "status": "open"},
+        {"$set": {"status": "finalizing", "expires_at": datetime.utcnow() + UPLOAD_SESSION_TTL}}
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Upload session is already being finalized")
+    
+    try:
+        writer = await run_in_threadpool(blob_store.writer, session["type"])
+        await run_in_threadpool(blob_store.assemble, session_id, session["total_chunks"], writer)
+        blob_id = await commit_blob(writer)
+    except BaseException:
+        await db.upload_sessions.update_one({"_id": session["_id"]}, {"$set": {"status": "open"}})
+        raise
+    
+    file_response = await create_file_record(
+        user_id, session["name"], session["type"], writer.size, blob_id, folder
+    )
+    
+    await db.upload_sessions.delete_one({"_id": session["_id"]})
+    await run_in_threadpool(blob_store.delete_session, session_id)
+    
+    return file_response
+
+@api_router.delete("/uploads/{session_id}")
+async def abort_upload_session(session_id: str, user_id: str = Depends(get_current_user)):
+    session = await get_upload_session(session_id, user_id)
+    await db.upload_sessions.delete_one({"_id": session["_id"]})
+    await run_in_threadpool(blob_store.delete_session, session_id)
+    
+    return {"success": True}
+
+async def collect_upload_sessions():
+    """Periodically remove upload sessions that have not seen a chunk within their TTL."""
+    while True:
+        try:
+            expired = await db.upload_sessions.find(
+                {"expires_at": {"$lt": datetime.utcnow()}},
+                {"_id": 1}
+            ).to_list(1000)
+            for session in expired:
+                await run_in_threadpool(blob_store.delete_session, str(session["_id"]))
+                await db.upload_sessions.delete_one({"_id": session["_id"]})
+            if expired:
+                logger.info("Removed %d abandoned upload sessions", len(expired))
+        except Exception:
+            logger.exception("Upload session cleanup failed")
+        await asyncio.sleep(UPLOAD_SESSION_GC_INTERVAL)
 
 # ============ DRIVE ITEMS ROUTES ============
 
+# Sort key per collection; a folder's size is the recursive total of its contents
+DRIVE_SORT_FIELDS = {
+    "name": ("name", "name"),
+    "modified": ("modified_at", "modified_at"),
+    "size": ("contents.bytes", "size"),
+}
+DRIVE_PAGE_SIZE = 1000
+
+async def fetch_page(collection, query, field, direction, after, limit, projection=None):
+    """Fetch up to `limit` documents ordered by (field, _id), strictly after `after`."""
+    if after is not None:
+        query = {"$and": [query, keyset_filter(field, direction, *after)]}
+    cursor = collection.find(query, projection).sort([(field, direction), ("_id", direction)]).limit(limit)
+    return await cursor.to_list(limit)
+
+async def paginate_drive_items(folder_query, file_query, sort, direction, limit, cursor):
+    """Page through folders, then files, using keyset continuation tokens.
+    
+    Every page is a bounded index range scan, so page N costs the same as page 1.
+    """
+    folder_field, file_field = DRIVE_SORT_FIELDS[sort]
+    state = {"phase": "folders", "after": None}
+    if cursor:
+        state = decode_cursor(cursor)
+        if state.get("phase") not in ("folders", "files") or state.get("sort") != sort or state.get("direction") != direction:
+            raise InvalidCursor("Cursor does not match this listing")
+    
+    folders = []
+    if state["phase"] == "folders":
+        # Fetch one extra row to find out whether another page follows
+        folders = await fetch_page(db.folders, folder_query, folder_field, direction, cursor_after(state), limit + 1, FOLDER_LIST_PROJECTION)
+        if len(folders) > limit:
+            folders = folders[:limit]
+            last = folders[-1]
+            next_state = {"phase": "folders", "after": [sort_value(last, folder_field), last["_id"]]}
+            return folders, [], encode_cursor({**next_state, "sort": sort, "direction": direction})
+        state = {"phase": "files", "after": None}
+    
+    remaining = limit - len(folders)
+    files = await fetch_page(db.files, file_query, file_field, direction, cursor_after(state), remaining + 1, FILE_LIST_PROJECTION)
+    next_cursor = None
+    if len(files) > remaining:
+        files = files[:remaining]
+        if files:
+            last = files[-1]
+            after = [sort_value(last, file_field), last["_id"]]
+        else:
+            after = None
+        next_cursor = encode_cursor({"phase": "files", "after": after, "sort": sort, "direction": direction})
+    return folders, files, next_cursor
+
+SEARCH_MAX_RESULTS = 100
+SEARCH_CANDIDATES = 500
+
+async def search_candidates(collection, query, keys, first: str, projection) -> list:
+    """Up to SEARCH_CANDIDATES matches, those whose first word matches the query first.
+    
+    Exact names, names starting with the query and names whose first word
+    matches it are the top relevance tiers, and all have `first` in
+    search_first; other matches only fill what is left. Ranking is
+    best-effort past that: with more than SEARCH_CANDIDATES matches in a
+    tier, which of them are ranked is arbitrary.
+    """
+    docs = await collection.find(
+        {**query, "search_keys": keys, "search_first": first}, projection
+    ).limit(SEARCH_CANDIDATES).to_list(SEARCH_CANDIDATES)
+    if len(docs) < SEARCH_CANDIDATES:
+        remaining = SEARCH_CANDIDATES - len(docs)
+        docs += await collection.find(
+            {**query, "search_keys": keys, "search_first": {"$ne": first}}, projection
+        ).limit(remaining).to_list(remaining)
+    return docs
+
+async def search_drive_items(folder_query, file_query, search: str, limit: int):
+    """Typeahead name search over the search_keys index, ranked by relevance."""
+    tokens = tokenize(search)
+    if not tokens:
+        return [], []
+    keys = {"$all": query_keys(tokens)}
+    first = tokens[0][:MAX_PREFIX_LENGTH]
+    limit = min(limit, SEARCH_MAX_RESULTS)
+    
+    folders = []
+    if folder_query is not None:
+        folders = await search_candidates(db.folders, folder_query, keys, first, FOLDER_LIST_PROJECTION)
+    files = await search_candidates(db.files, file_query, keys, first, FILE_LIST_PROJECTION)
+    
+    return rank(folders, search, tokens, limit), rank(files, search, tokens, limit)
+
 @api_router.get("/drive/items", response_model=DriveItemsResponse)
 async def get_drive_items(
     view: str = Query("drive"),
     folderId: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    sort: str = Query("name"),
+    order: str = Query("asc"),
+    limit: int = Query(DRIVE_PAGE_SIZE, ge=1, le=DRIVE_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
     user_id: str = Depends(get_current_user)
 ):
+    if sort not in DRIVE_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort: {sort}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"Invalid order: {order}")
+    direction = ASCENDING if order == "asc" else DESCENDING
+    
     folder_query = {"owner_id": ObjectId(user_id)}
     file_query = {"owner_id": ObjectId(user_id)}
     
@@ -264,115 +1078,105 @@ async def get_drive_items(
     if view == "recent":
         file_query["last_opened"] = {"$ne": None}
         file_query["trashed"] = False
-        files_cursor = db.files.find(file_query).sort("last_opened", -1).limit(20)
-        folders = []
     elif view == "starred":
         folder_query["starred"] = True
         folder_query["trashed"] = False
         file_query["starred"] = True
         file_query["trashed"] = False
-        folders_cursor = db.folders.find(folder_query)
-        files_cursor = db.files.find(file_query)
     elif view == "shared":
         # Get shared items
-        shares = await db.shares.find({"user_id": ObjectId(user_id)}).to_list(1000)
-        shared_ids = [s["item_id"] for s in shares]
+        shared_ids = list(await acl_cache.grants(ObjectId(user_id)))
         folder_query = {"_id": {"$in": shared_ids}, "trashed": False}
         file_query = {"_id": {"$in": shared_ids}, "trashed": False}
-        folders_cursor = db.folders.find(folder_query)
-        files_cursor = db.files.find(file_query)
     elif view == "trash":
+        # Items trashed along with a folder are shown through that folder
         folder_query["trashed"] = True
+        folder_query["trashed_by"] = None
         file_query["trashed"] = True
-        folders_cursor = db.folders.find(folder_query)
-        files_cursor = db.files.find(file_query)
+        file_query["trashed_by"] = None
     else:  # drive
-        folder_query["trashed"] = False
-        file_query["trashed"] = False
+        if folderId:
+            folder = await db.folders.find_one({"_id": ObjectId(folderId)}, {"owner_id": 1, "ancestors": 1, "trashed": 1})
+            if not folder:
+                raise HTTPException(status_code=404, detail="Folder not found")
+            await authorize(folder, user_id, "viewer")
+            # A shared folder lists its owner's items
+            folder_query["owner_id"] = file_query["owner_id"] = folder["owner_id"]
         folder_query["parent_id"] = ObjectId(folderId) if folderId else None
         file_query["folder_id"] = ObjectId(folderId) if folderId else None
-        folders_cursor = db.folders.find(folder_query)
-        files_cursor = db.files.find(file_query)
+        folder_query["trashed"] = False
+        file_query["trashed"] = False
     
-    # Apply search
+    next_cursor = None
     if search:
-        folder_query["name"] = {"$regex": search, "$options": "i"}
-        file_query["name"] = {"$regex": search, "$options": "i"}
-        folders_cursor = db.folders.find(folder_query)
-        files_cursor = db.files.find(file_query)
-    
-    if view == "recent":
+        folders, files = await search_drive_items(
+            None if view == "recent" else folder_query, file_query, search, limit
+        )
+    elif view == "recent":
         folders = []
+        files = await db.files.find(file_query, FILE_LIST_PROJECTION).sort("last_opened", -1).limit(20).to_list(20)
     else:
-        folders = await folders_cursor.to_list(1000)
-    files = await files_cursor.to_list(1000)
-    
-    # Format responses
-    folder_responses = []
-    for folder in folders:
-        folder_responses.append(FolderResponse(
-            id=str(folder["_id"]),
-            name=folder["name"],
-            parentId=str(folder["parent_id"]) if folder.get("parent_id") else None,
-            ownerId=str(folder["owner_id"]),
-            created=format_datetime(folder["created_at"]),
-            modified=format_datetime(folder["modified_at"]),
-            starred=folder.get("starred", False),
-            trashed=folder.get("trashed", False)
-        ))
-    
-    file_responses = []
-    for file in files:
-        file_responses.append(FileResponse(
-            id=str(file["_id"]),
-            name=file["name"],
-            type=file["type"],
-            size=file["size"],
-            folderId=str(file["folder_id"]) if file.get("folder_id") else None,
-            ownerId=str(file["owner_id"]),
-            created=format_datetime(file["created_at"]),
-            modified=format_datetime(file["modified_at"]),
-            starred=file.get("starred", False),
-            trashed=file.get("trashed", False),
-            thumbnail=file["metadata"].get("thumbnail_url"),
-            lastOpened=format_datetime(file.get("last_opened")) if file.get("last_opened") else None,
-            url=f"/api/files/{str(file['_id'])}/download"
-        ))
+        try:
+            folders, files, next_cursor = await paginate_drive_items(folder_query, file_query, sort, direction, limit, cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
-    return DriveItemsResponse(folders=folder_responses, files=file_responses)
+    return FastJSONResponse({
+        "folders": [folder_row(folder) for folder in folders],
+        "files": [file_row(file) for file in files],
+        "nextCursor": next_cursor
+    })
 
 # ============ ITEM UPDATE ROUTES ============
 
 @api_router.patch("/items/{item_id}")
 async def update_item(item_id: str, update_data: ItemUpdate, user_id: str = Depends(get_current_user)):
-    # Try to find as file first
-    item = await db.files.find_one({"_id": ObjectId(item_id), "owner_id": ObjectId(user_id)})
-    collection = "files"
-    
-    if not item:
-        # Try folder
-        item = await db.folders.find_one({"_id": ObjectId(item_id), "owner_id": ObjectId(user_id)})
-        collection = "folders"
-    
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
+    # Editors may rename; starring and moving change the owner's drive
+    owner_only = update_data.starred is not None or update_data.parentId is not None or update_data.folderId is not None
+    collection, item = await resolve_item(item_id, user_id, "owner" if owner_only else "editor")
     
     # Build update dict
     update_dict = {"modified_at": datetime.utcnow()}
     if update_data.name is not None:
         update_dict["name"] = update_data.name
+        update_dict.update(search_fields(update_data.name))
     if update_data.starred is not None:
         update_dict["starred"] = update_data.starred
+    if item.get("trashed") and (update_data.parentId is not None or update_data.folderId is not None):
+        raise HTTPException(status_code=400, detail="Item is in trash")
     if update_data.parentId is not None and collection == "folders":
-        update_dict["parent_id"] = ObjectId(update_data.parentId) if update_data.parentId else None
+        parent = await get_parent_folder(update_data.parentId, user_id)
+        if parent and (parent["_id"] == item["_id"] or item["_id"] in parent.get("ancestors", [])):
+            raise HTTPException(status_code=400, detail="Cannot move a folder into itself")
+        update_dict["parent_id"] = parent["_id"] if parent else None
+        update_dict["ancestors"] = child_ancestors(parent)
     if update_data.folderId is not None and collection == "files":
-        update_dict["folder_id"] = ObjectId(update_data.folderId) if update_data.folderId else None
+        folder = await get_parent_folder(update_data.folderId, user_id)
+        update_dict["folder_id"] = folder["_id"] if folder else None
+        update_dict["ancestors"] = child_ancestors(folder)
     
     # Update
+    old_ancestors = item.get("ancestors", [])
+    moved = "ancestors" in update_dict and update_dict["ancestors"] != old_ancestors
     if collection == "files":
         await db.files.update_one({"_id": ObjectId(item_id)}, {"$set": update_dict})
+        changes = file_contents_changes(item, 1)
     else:
         await db.folders.update_one({"_id": ObjectId(item_id)}, {"$set": update_dict})
+        changes = folder_contents_changes(item, 1)
+        if moved:
+            # Re-root everything below the folder in one update per collection
+            rebase = rebase_ancestors(old_ancestors, update_dict["ancestors"])
+            await db.folders.update_many(subtree_filter(item["_id"]), rebase)
+            await db.files.update_many(subtree_filter(item["_id"]), rebase)
+        if moved or update_data.name is not None:
+            invalidate_folder_tree(item["owner_id"])
+    
+    if moved:
+        # Only the folders the item left or joined see their totals change
+        new_ancestors = update_dict["ancestors"]
+        await propagate_contents(db, [a for a in old_ancestors if a not in new_ancestors], {k: -v for k, v in changes.items()})
+        await propagate_contents(db, [a for a in new_ancestors if a not in old_ancestors], changes)
     
     # Log activity
     if update_data.starred is not None:
@@ -383,73 +1187,543 @@ async def update_item(item_id: str, update_data: ItemUpdate, user_id: str = Depe
     
     return {"success": True}
 
-@api_router.delete("/items/{item_id}")
-async def delete_item(item_id: str, permanent: bool = Query(False), user_id: str = Depends(get_current_user)):
-    # Try to find as file first
-    item = await db.files.find_one({"_id": ObjectId(item_id), "owner_id": ObjectId(user_id)})
-    collection = "files"
+async def subtree_storage_changes(match: dict, sign: int, used: bool = True, breakdown: bool = True) -> dict:
+    """storage_changes() summed over every file matching `match`, in one aggregation."""
+    totals = await db.files.aggregate([
+        {"$match": match},
+        {"$group": {"_id": STORAGE_CATEGORY_EXPR, "bytes": {"$sum": "$size"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    changes = {}
+    for total in totals:
+        if used:
+            changes["storage_used"] = changes.get("storage_used", 0) + sign * total["bytes"]
+        if breakdown:
+            changes[f"storage_breakdown.{total['_id']}.bytes"] = sign * total["bytes"]
+            changes[f"storage_breakdown.{total['_id']}.count"] = sign * total["count"]
+    return changes
+
+async def trash_folder(folder):
+    """Trash a folder and, with one update per collection, everything below it not already in trash."""
+    result = await db.folders.update_one(
+        {"_id": folder["_id"], "trashed": False},
+        {"$set": {"trashed": True, "modified_at": datetime.utcnow()}, "$unset": {"trashed_by": ""}}
+    )
+    if not result.modified_count:
+        return
+    await propagate_contents(db, folder.get("ancestors", []), folder_contents_changes(folder, -1))
     
-    if not item:
-        # Try folder
-        item = await db.folders.find_one({"_id": ObjectId(item_id), "owner_id": ObjectId(user_id)})
-        collection = "folders"
+    hidden = {"$set": {"trashed": True, "trashed_by": folder["_id"]}}
+    await db.folders.update_many(subtree_filter(folder["_id"], trashed=False), hidden)
+    await db.files.update_many(subtree_filter(folder["_id"], trashed=False), hidden)
+    invalidate_folder_tree(folder["owner_id"])
+    changes = await subtree_storage_changes(subtree_filter(folder["_id"], trashed_by=folder["_id"]), -1, used=False)
+    if changes:
+        await db.users.update_one({"_id": folder["owner_id"]}, {"$inc": changes})
+
+async def restore_subtree(folder_id, user_id: str):
+    """Bring back everything that was trashed along with a folder."""
+    match = subtree_filter(folder_id, trashed_by=folder_id)
+    changes = await subtree_storage_changes(match, 1, used=False)
     
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
+    restored = {"$set": {"trashed": False}, "$unset": {"trashed_by": ""}}
+    await db.folders.update_many(match, restored)
+    await db.files.update_many(match, restored)
+    if changes:
+        await db.users.update_one({"_id": ObjectId(user_id)}, {"$inc": changes})
+
+async def purge_subtree(folder_id, user_id: str):
+    """Permanently delete everything below a trashed folder and reclaim its storage.
+    
+    The whole subtree is in trash, so only storage_used still counts it.
+    """
+    match = subtree_filter(folder_id)
+    changes = await subtree_storage_changes(match, -1, breakdown=False)
+    references = await db.files.aggregate([
+        {"$match": {**match, "blob_id": {"$ne": None}}},
+        {"$group": {"_id": "$blob_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    
+    await db.files.delete_many(match)
+    await db.folders.delete_many(match)
+    if changes:
+        await db.users.update_one({"_id": ObjectId(user_id)}, {"$inc": changes})
+    await release_blobs({ref["_id"]: ref["count"] for ref in references})
+
+@api_router.delete("/items/{item_id}")
+async def delete_item(item_id: str, permanent: bool = Query(False), user_id: str = Depends(get_current_user)):
+    collection, item = await resolve_item(item_id, user_id)
     
     if permanent:
         # Permanent delete
         if collection == "files":
-            await db.files.delete_one({"_id": ObjectId(item_id)})
-            # Update storage
-            await db.users.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$inc": {"storage_used": -item["size"]}}
-            )
+            deleted = await db.files.find_one_and_delete({"_id": ObjectId(item_id)})
+            if deleted:
+                # Trashed files no longer count towards the breakdown
+                await db.users.update_one(
+                    {"_id": ObjectId(user_id)},
+                    {"$inc": storage_changes(deleted, -1, breakdown=not deleted.get("trashed", False))}
+                )
+                await propagate_contents(db, counted_by(deleted), file_contents_changes(deleted, -1))
+                if deleted.get("blob_id"):
+                    await release_blob(deleted["blob_id"])
         else:
-            await db.folders.delete_one({"_id": ObjectId(item_id)})
+            if not item.get("trashed"):
+                # Takes the subtree out of the breakdown so purging only touches storage_used
+                await trash_folder(item)
+            else:
+                # Still counted above if it was trashed along with a parent
+                await propagate_contents(db, counted_by(item), folder_contents_changes(item, -1))
+            await purge_subtree(item["_id"], user_id)
+            await db.folders.delete_one({"_id": item["_id"]})
         
         await log_activity(user_id, "delete", item_id, f"Permanently deleted {item['name']}")
         return {"success": True, "message": "Item deleted permanently"}
     else:
         # Move to trash
         if collection == "files":
-            await db.files.update_one({"_id": ObjectId(item_id)}, {"$set": {"trashed": True, "modified_at": datetime.utcnow()}})
+            result = await db.files.update_one(
+                {"_id": ObjectId(item_id), "trashed": False},
+                {"$set": {"trashed": True, "modified_at": datetime.utcnow()}}
+            )
+            if result.modified_count:
+                await db.users.update_one(
+                    {"_id": ObjectId(user_id)},
+                    {"$inc": storage_changes(item, -1, used=False)}
+                )
+                await propagate_contents(db, item.get("ancestors", []), file_contents_changes(item, -1))
         else:
-            await db.folders.update_one({"_id": ObjectId(item_id)}, {"$set": {"trashed": True, "modified_at": datetime.utcnow()}})
+            await trash_folder(item)
         
         await log_activity(user_id, "delete", item_id, f"Moved {item['name']} to trash")
         return {"success": True, "message": "Item moved to trash"}
 
 @api_router.post("/items/{item_id}/restore")
 async def restore_item(item_id: str, user_id: str = Depends(get_current_user)):
-    # Try to find as file first
-    item = await db.files.find_one({"_id": ObjectId(item_id), "owner_id": ObjectId(user_id)})
-    collection = "files"
-    
-    if not item:
-        item = await db.folders.find_one({"_id": ObjectId(item_id), "owner_id": ObjectId(user_id)})
-        collection = "folders"
-    
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
+    collection, item = await resolve_item(item_id, user_id)
+    if item.get("trashed_by"):
+        raise HTTPException(status_code=400, detail="Item was trashed with its folder; restore the folder instead")
+    if item.get("ancestors"):
+        parent = await db.folders.find_one({"_id": item["ancestors"][-1]}, {"trashed": 1})
+        if parent and parent.get("trashed"):
+            raise HTTPException(status_code=400, detail="Restore the containing folder first")
     
     if collection == "files":
-        await db.files.update_one({"_id": ObjectId(item_id)}, {"$set": {"trashed": False, "modified_at": datetime.utcnow()}})
+        result = await db.files.update_one(
+            {"_id": ObjectId(item_id), "trashed": True},
+            {"$set": {"trashed": False, "modified_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            await db.users.update_one(
+                {"_id": ObjectId(user_id)},
+                {"$inc": storage_changes(item, 1, used=False)}
+            )
+            await propagate_contents(db, item.get("ancestors", []), file_contents_changes(item, 1))
     else:
-        await db.folders.update_one({"_id": ObjectId(item_id)}, {"$set": {"trashed": False, "modified_at": datetime.utcnow()}})
+        result = await db.folders.update_one(
+            {"_id": item["_id"], "trashed": True, "trashed_by": None},
+            {"$set": {"trashed": False, "modified_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            await propagate_contents(db, item.get("ancestors", []), folder_contents_changes(item, 1))
+            await restore_subtree(item["_id"], user_id)
+            invalidate_folder_tree(user_id)
     
     await log_activity(user_id, "edit", item_id, f"Restored {item['name']}")
     return {"success": True}
 
+# ============ BATCH ITEM ROUTES ============
+
+# Multi-select operations. Ownership is checked with one $in query over
+# both collections and updates go out as bulk writes; only folders, whose
+# subtrees move with them, still cost a few queries each.
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 5000))
+BATCH_OPERATIONS = ("star", "unstar", "move", "trash", "restore", "delete")
+
+def add_changes(total: dict, changes: dict):
+    """Sum an $inc document into `total`."""
+    for key, value in changes.items():
+        total[key] = total.get(key, 0) + value
+
+async def batch_star(files, folders, value: bool, user_id: str, errors: dict) -> list:
+    now = datetime.utcnow()
+    for collection, docs in ((db.files, files), (db.folders, folders)):
+        if docs:
+            await collection.update_many(
+                {"_id": {"$in": [doc["_id"] for doc in docs]}},
+                {"$set": {"starred": value, "modified_at": now}}
+            )
+    action = "Starred" if value else "Unstarred"
+    return [("star", doc["_id"], f"{action} {doc['name']}") for doc in files + folders]
+
+async def batch_move(files, folders, target, user_id: str, errors: dict) -> list:
+    new_ancestors = child_ancestors(target)
+    target_path = set(new_ancestors)
+    
+    def movable(doc):
+        if doc.get("trashed"):
+            errors[doc["_id"]] = "Item is in trash"
+            return False
+        return doc.get("ancestors", []) != new_ancestors
+    
+    moving_files = [file for file in files if movable(file)]
+    moving_folders = []
+    for folder in folders:
+        if folder["_id"] in target_path:
+            errors[folder["_id"]] = "Cannot move a folder into itself"
+        elif movable(folder):
+            moving_folders.append(folder)
+    
+    now = datetime.utcnow()
+    placed = {"ancestors": new_ancestors, "modified_at": now}
+    folder_updates, file_updates = [], []
+    if moving_folders:
+        folder_updates.append(UpdateMany(
+            {"_id": {"$in": [folder["_id"] for folder in moving_folders]}},
+            {"$set": {**placed, "parent_id": target["_id"] if target else None}}
+        ))
+    if moving_files:
+        file_updates.append(UpdateMany(
+            {"_id": {"$in": [file["_id"] for file in moving_files]}},
+            {"$set": {**placed, "folder_id": target["_id"] if target else None}}
+        ))
+    pending = {}
+    for folder in moving_folders:
+        # Each subtree keeps its own old prefix, so it gets its own rebase
+        rebase = rebase_ancestors(folder.get("ancestors", []), new_ancestors)
+        folder_updates.append(UpdateMany(subtree_filter(folder["_id"]), rebase))
+        file_updates.append(UpdateMany(subtree_filter(folder["_id"]), rebase))
+    moved = [(file, file_contents_changes(file, 1)) for file in moving_files]
+    moved += [(folder, folder_contents_changes(folder, 1)) for folder in moving_folders]
+    for doc, changes in moved:
+        old_ancestors = doc.get("ancestors", [])
+        accumulate_contents(pending, [a for a in old_ancestors if a not in target_path], {k: -v for k, v in changes.items()})
+        accumulate_contents(pending, [a for a in new_ancestors if a not in old_ancestors], changes)
+    
+    if folder_updates:
+        await db.folders.bulk_write(folder_updates, ordered=False)
+    if file_updates:
+        await db.files.bulk_write(file_updates, ordered=False)
+    await apply_contents(db, pending)
+    if moving_folders:
+        invalidate_folder_tree(user_id)
+    return [("edit", doc["_id"], f"Moved {doc['name']}") for doc in moving_files + moving_folders]
+
+async def batch_trash(files, folders, user_id: str, errors: dict) -> list:
+    for folder in folders:
+        await trash_folder(folder)
+    
+    trashing = [file for file in files if not file.get("trashed")]
+    if trashing:
+        await db.files.update_many(
+            {"_id": {"$in": [file["_id"] for file in trashing]}, "trashed": False},
+            {"$set": {"trashed": True, "modified_at": datetime.utcnow()}}
+        )
+        storage, pending = {}, {}
+        for file in trashing:
+            add_changes(storage, storage_changes(file, -1, used=False))
+            accumulate_contents(pending, file.get("ancestors", []), file_contents_changes(file, -1))
+        await db.users.update_one({"_id": ObjectId(user_id)}, {"$inc": storage})
+        await apply_contents(db, pending)
+    return [("delete", doc["_id"], f"Moved {doc['name']} to trash") for doc in files + folders]
+
+async def trashed_parents(docs) -> set:
+    """Ids of the trashed folders directly containing any of `docs`."""
+    parent_ids = list({doc["ancestors"][-1] for doc in docs if doc.get("ancestors")})
+    parents = await db.folders.find({"_id": {"$in": parent_ids}, "trashed": True}, {"_id": 1}).to_list(None)
+    return {parent["_id"] for parent in parents}
+
+async def batch_restore(files, folders, user_id: str, errors: dict) -> list:
+    restored_ids = set()
+    
+    def restorable(doc, trashed_parents):
+        if doc.get("trashed_by") in restored_ids:
+            # Selected along with its folder, and already back with it
+            return False
+        if doc.get("trashed_by"):
+            errors[doc["_id"]] = "Item was trashed with its folder; restore the folder instead"
+        elif doc.get("ancestors") and doc["ancestors"][-1] in trashed_parents:
+            errors[doc["_id"]] = "Restore the containing folder first"
+        return doc["_id"] not in errors and doc.get("trashed")
+    
+    restored = []
+    # Shallowest first, so a selected parent is back before its children are checked
+    blocked = await trashed_parents(folders)
+    for folder in sorted(folders, key=lambda folder: len(folder.get("ancestors", []))):
+        if not restorable(folder, blocked):
+            continue
+        result = await db.folders.update_one(
+            {"_id": folder["_id"], "trashed": True, "trashed_by": None},
+            {"$set": {"trashed": False, "modified_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            await propagate_contents(db, folder.get("ancestors", []), folder_contents_changes(folder, 1))
+            await restore_subtree(folder["_id"], user_id)
+            blocked.discard(folder["_id"])
+            restored_ids.add(folder["_id"])
+            restored.append(folder)
+    if restored:
+        invalidate_folder_tree(user_id)
+    
+    # Checked after the folders so files in a restored folder can follow it
+    blocked = await trashed_parents(files)
+    restoring = [file for file in files if restorable(file, blocked)]
+    if restoring:
+        await db.files.update_many(
+            {"_id": {"$in": [file["_id"] for file in restoring]}, "trashed": True, "trashed_by": None},
+            {"$set": {"trashed": False, "modified_at": datetime.utcnow()}}
+        )
+        storage, pending = {}, {}
+        for file in restoring:
+            add_changes(storage, storage_changes(file, 1, used=False))
+            accumulate_contents(pending, file.get("ancestors", []), file_contents_changes(file, 1))
+        await db.users.update_one({"_id": ObjectId(user_id)}, {"$inc": storage})
+        await apply_contents(db, pending)
+    return [("edit", doc["_id"], f"Restored {doc['name']}") for doc in restored + restoring]
+
+async def batch_delete(files, folders, user_id: str, errors: dict) -> list:
+    for folder in folders:
+        if not folder.get("trashed"):
+            await trash_folder(folder)
+        else:
+            await propagate_contents(db, counted_by(folder), folder_contents_changes(folder, -1))
+        await purge_subtree(folder["_id"], user_id)
+    if folders:
+        await db.folders.delete_many({"_id": {"$in": [folder["_id"] for folder in folders]}})
+    
+    if files:
+        await db.files.delete_many({"_id": {"$in": [file["_id"] for file in files]}})
+        storage, pending, references = {}, {}, {}
+        for file in files:
+            add_changes(storage, storage_changes(file, -1, breakdown=not file.get("trashed", False)))
+            accumulate_contents(pending, counted_by(file), file_contents_changes(file, -1))
+            if file.get("blob_id"):
+                references[file["blob_id"]] = references.get(file["blob_id"], 0) + 1
+        await db.users.update_one({"_id": ObjectId(user_id)}, {"$inc": storage})
+        await apply_contents(db, pending)
+        await release_blobs(references)
+    return [("delete", doc["_id"], f"Permanently deleted {doc['name']}") for doc in files + folders]
+
+@api_router.post("/items/batch", response_model=ItemBatchResponse)
+async def batch_items(batch: ItemBatchRequest, user_id: str = Depends(get_current_user)):
+    if batch.operation not in BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid operation: {batch.operation}")
+    if len(batch.ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    target = await get_parent_folder(batch.folderId, user_id) if batch.operation == "move" else None
+    
+    requested = list(dict.fromkeys(batch.ids))
+    errors = {item_id: "Invalid item id" for item_id in requested if not ObjectId.is_valid(item_id)}
+    ids = [ObjectId(item_id) for item_id in requested if item_id not in errors]
+    
+    files, folders = [], []
+    for item in await find_items({"_id": {"$in": ids}, "owner_id": ObjectId(user_id)}):
+        (files if item.pop("kind") == "file" else folders).append(item)
+    found = {item["_id"] for item in files + folders}
+    
+    if batch.operation in ("move", "trash", "delete"):
+        # Items inside a selected folder go along with it
+        selected_folders = {folder["_id"] for folder in folders}
+        files = [file for file in files if not selected_folders.intersection(file.get("ancestors", []))]
+        folders = [folder for folder in folders if not selected_folders.intersection(folder.get("ancestors", []))]
+    
+    item_errors = {}
+    if batch.operation in ("star", "unstar"):
+        activities = await batch_star(files, folders, batch.operation == "star", user_id, item_errors)
+    elif batch.operation == "move":
+        activities = await batch_move(files, folders, target, user_id, item_errors)
+    elif batch.operation == "trash":
+        activities = await batch_trash(files, folders, user_id, item_errors)
+    elif batch.operation == "restore":
+        activities = await batch_restore(files, folders, user_id, item_errors)
+    else:
+        activities = await batch_delete(files, folders, user_id, item_errors)
+    
+    # The activity writer flushes these with insert_many
+    for activity_type, item_id, description in activities:
+        await log_activity(user_id, activity_type, str(item_id), description)
+    
+    results = []
+    for item_id in requested:
+        error = errors.get(item_id)
+        if error is None and ObjectId(item_id) not in found:
+            error = "Item not found"
+        if error is None:
+            error = item_errors.get(ObjectId(item_id))
+        results.append(ItemBatchResult(id=item_id, success=error is None, error=error))
+    succeeded = sum(result.success for result in results)
+    return ItemBatchResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+# ============ ARCHIVE ROUTES ============
+
+# Folders and multi-selections download as one ZIP64 archive, built while it
+# is sent. Reads and compression run on a dedicated pool one chunk at a
+# time, so at most ARCHIVE_MAX_CONCURRENT threads work on archives however
+# many are streaming; further archives are turned away while every slot is
+# busy. A slot is taken by the handler and given back by ArchiveResponse.
+ARCHIVE_MAX_CONCURRENT = int(os.environ.get('ARCHIVE_MAX_CONCURRENT', 4))
+ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get('ARCHIVE_COMPRESSION_LEVEL', 6))
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_FILE_PROJECTION = {"name": 1, "type": 1, "blob_id": 1, "metadata.storage_data": 1, "ancestors": 1, "modified_at": 1}
+
+archive_slots = asyncio.Semaphore(ARCHIVE_MAX_CONCURRENT)
+archive_executor = ThreadPoolExecutor(max_workers=ARCHIVE_MAX_CONCURRENT, thread_name_prefix="archives")
+
+def file_chunks(file_doc):
+    """iter_file_content() that only touches storage once iterated, on the archive pool."""
+    yield from iter_file_content(file_doc)
+
+async def archive_subtree_files(folder_id):
+    """Live files below a folder, in _id batches so no cursor outlives a slow download."""
+    last_id = None
+    while True:
+        query = subtree_filter(folder_id, trashed=False)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        files = await db.files.find(query, ARCHIVE_FILE_PROJECTION).sort("_id", ASCENDING).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        for file_doc in files:
+            yield file_doc
+        if len(files) < ARCHIVE_BATCH_SIZE:
+            return
+        last_id = files[-1]["_id"]
+
+async def stream_archive(roots: list):
+    """Yield a ZIP of the given files and folders; folders bring their live subtrees."""
+    loop = asyncio.get_running_loop()
+    
+    async def run(fn, *args):
+        return await loop.run_in_executor(archive_executor, fn, *args)
+    
+    async def add_file(archive, file_doc, path):
+        chunks = archive.add_file(path, file_chunks(file_doc), file_doc["modified_at"], is_compressible(file_doc["type"]))
+        while True:
+            try:
+                data = await run(next, chunks, None)
+            except BlobNotFound:
+                logger.warning("Leaving %s out of an archive: file content not found", file_doc["_id"])
+                return
+            if data is None:
+                return
+            if data:
+                yield data
+    
+    archive = ZipStream(ARCHIVE_COMPRESSION_LEVEL)
+    for root in roots:
+        if root["kind"] == "file":
+            async for data in add_file(archive, root, safe_name(root["name"])):
+                yield data
+            continue
+        
+        # Parents come before their children, so each folder's entry path
+        # (renamed if a sibling has the same name) is known before anything
+        # inside it is added
+        folders = await db.folders.find(
+            subtree_filter(root["_id"], trashed=False),
+            {"name": 1, "ancestors": 1, "modified_at": 1}
+        ).to_list(None)
+        folders.sort(key=lambda folder: len(folder.get("ancestors", [])))
+        paths = {}
+        for folder in [root] + folders:
+            parent_path = paths.get(folder["ancestors"][-1]) if folder is not root else ""
+            if parent_path is None:
+                continue
+            name = safe_name(folder["name"])
+            path, data = await run(archive.add_directory, f"{parent_path}/{name}" if parent_path else name, folder["modified_at"])
+            paths[folder["_id"]] = path
+            yield data
+        async for file_doc in archive_subtree_files(root["_id"]):
+            parent_path = paths.get(file_doc["ancestors"][-1])
+            if parent_path is None:
+                continue
+            async for data in add_file(archive, file_doc, f"{parent_path}/{safe_name(file_doc['name'])}"):
+                yield data
+    yield await run(archive.close)
+
+class ArchiveResponse(StreamingResponse):
+    """StreamingResponse that gives back its archive slot however the stream ends.
+    
+    Releasing in __call__ rather than in the generator also covers clients
+    that disconnect before the first chunk, when the generator never starts.
+    """
+    
+    def __init__(self, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self._released = False
+    
+    def release(self):
+        if not self._released:
+            self._released = True
+            archive_slots.release()
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+async def archive_response(roots: list, name: str) -> ArchiveResponse:
+    # Built first: once the slot is taken nothing may raise before the
+    # response that releases it is returned
+    response = ArchiveResponse(
+        stream_archive(roots),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(f"{safe_name(name)}.zip")}
+    )
+    # Checking and taking the slot happen without a yield in between, so
+    # requests beyond the limit get a 503 instead of queueing after a 200
+    if archive_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many archives in progress", headers={"Retry-After": "30"})
+    await archive_slots.acquire()
+    return response
+
+@api_router.get("/folders/{folder_id}/archive")
+async def archive_folder(folder_id: str, user_id: str = Depends(get_current_user)):
+    if not ObjectId.is_valid(folder_id):
+        raise HTTPException(status_code=404, detail="Folder not found")
+    folder = await db.folders.find_one({"_id": ObjectId(folder_id)}, {"search_keys": 0})
+    if not folder:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    await authorize(folder, user_id, "viewer")
+    if folder.get("trashed"):
+        raise HTTPException(status_code=400, detail="Folder is in trash")
+    folder["kind"] = "folder"
+    return await archive_response([folder], folder["name"])
+
+@api_router.post("/items/archive")
+async def archive_items(selection: ItemArchiveRequest, user_id: str = Depends(get_current_user)):
+    if len(selection.ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per archive")
+    requested = list(dict.fromkeys(selection.ids))
+    if not all(ObjectId.is_valid(item_id) for item_id in requested):
+        raise HTTPException(status_code=400, detail="Invalid item id")
+    
+    items = await find_items(
+        {"_id": {"$in": [ObjectId(item_id) for item_id in requested]}, "trashed": False},
+        {"search_keys": 0}
+    )
+    if len(items) < len(requested):
+        raise HTTPException(status_code=404, detail="Item not found")
+    for item in items:
+        await authorize(item, user_id, "viewer")
+    
+    # Items inside a selected folder are archived with it
+    selected_folders = {item["_id"] for item in items if item["kind"] == "folder"}
+    roots = [item for item in items if not selected_folders.intersection(item.get("ancestors", []))]
+    return await archive_response(roots, selection.name or "download")
+
 # ============ SHARE ROUTES ============
 
 @api_router.post("/shares", response_model=ShareResponse)
 async def create_share(share_data: ShareCreate, user_id: str = Depends(get_current_user)):
+    if share_data.permission not in SHARE_ROLES:
+        raise HTTPException(status_code=400, detail=f"Invalid permission: {share_data.permission}")
+    collection, item = await resolve_item(share_data.itemId, user_id, "editor")
+    
     # Find user by email
     target_user = await db.users.find_one({"email": share_data.email})
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
+    if target_user["_id"] == item["owner_id"]:
+        raise HTTPException(status_code=400, detail="Cannot share an item with its owner")
     
     # Check if already shared
     existing_share = await db.shares.find_one({
@@ -467,7 +1741,7 @@ async def create_share(share_data: ShareCreate, user_id: str = Depends(get_curre
     else:
         share_doc = {
             "item_id": ObjectId(share_data.itemId),
-            "item_type": "file",  # Simplified for now
+            "item_type": "file" if collection == "files" else "folder",
             "user_id": target_user["_id"],
             "shared_by": ObjectId(user_id),
             "permission": share_data.permission,
@@ -475,6 +1749,7 @@ async def create_share(share_data: ShareCreate, user_id: str = Depends(get_curre
         }
         result = await db.shares.insert_one(share_doc)
         share_id = str(result.inserted_id)
+    acl_cache.invalidate(target_user["_id"])
     
     await log_activity(user_id, "share", share_data.itemId, f"Shared with {share_data.email}")
     
@@ -487,28 +1762,26 @@ async def create_share(share_data: ShareCreate, user_id: str = Depends(get_curre
         sharedAt=format_datetime(datetime.utcnow())
     )
 
-@api_router.get("/shares/{item_id}")
-async def get_shares(item_id: str, user_id: str = Depends(get_current_user)):
-    shares = await db.shares.find({"item_id": ObjectId(item_id)}).to_list(1000)
-    
-    result = []
-    for share in shares:
-        user = await db.users.find_one({"_id": share["user_id"]})
-        if user:
-            result.append(ShareWithUser(
-                id=str(user["_id"]),
-                name=user["name"],
-                email=user["email"],
-                permission=share["permission"]
-            ))
-    
-    return result
+@api_router.get("/shares/{item_id}", response_model=List[ShareWithUser])
+async def get_shares(item_id: str, user_id: str = Depends(get_current_user), users: UserLoader = Depends(get_user_loader)):
+    await resolve_item(item_id, user_id, "viewer")
+    shares = await db.shares.find({"item_id": ObjectId(item_id)}, SHARE_LIST_PROJECTION).to_list(1000)
+    share_users = await users.load_many(share["user_id"] for share in shares)
+    return FastJSONResponse([share_row(share, user) for share, user in zip(shares, share_users) if user])
 
 @api_router.delete("/shares/{share_id}")
 async def delete_share(share_id: str, user_id: str = Depends(get_current_user)):
-    result = await db.shares.delete_one({"_id": ObjectId(share_id)})
+    share = await db.shares.find_one({"_id": ObjectId(share_id)}) if ObjectId.is_valid(share_id) else None
+    if not share:
+        raise HTTPException(status_code=404, detail="Share not found")
+    # Anyone may leave a share; removing someone else's takes editor access
+    if share["user_id"] != ObjectId(user_id):
+        await resolve_item(str(share["item_id"]), user_id, "editor")
+    
+    result = await db.shares.delete_one({"_id": share["_id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Share not found")
+    acl_cache.invalidate(share["user_id"])
     
     return {"success": True}
 
@@ -516,6 +1789,10 @@ async def delete_share(share_id: str, user_id: str = Depends(get_current_user)):
 
 @api_router.post("/comments", response_model=CommentResponse)
 async def create_comment(comment_data: CommentCreate, user_id: str = Depends(get_current_user)):
+    file_doc = await db.files.find_one({"_id": ObjectId(comment_data.fileId)}, {"owner_id": 1, "ancestors": 1, "trashed": 1})
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    await authorize(file_doc, user_id, "commenter")
     user = await db.users.find_one({"_id": ObjectId(user_id)})
     
     comment_doc = {
@@ -535,23 +1812,15 @@ async def create_comment(comment_data: CommentCreate, user_id: str = Depends(get
         timestamp=format_datetime(comment_doc["created_at"])
     )
 
-@api_router.get("/comments/{file_id}")
-async def get_comments(file_id: str, user_id: str = Depends(get_current_user)):
-    comments = await db.comments.find({"file_id": ObjectId(file_id)}).to_list(1000)
-    
-    result = []
-    for comment in comments:
-        user = await db.users.find_one({"_id": comment["user_id"]})
-        result.append(CommentResponse(
-            id=str(comment["_id"]),
-            fileId=file_id,
-            userId=str(comment["user_id"]),
-            userName=user["name"] if user else "Unknown",
-            text=comment["text"],
-            timestamp=format_datetime(comment["created_at"])
-        ))
-    
-    return result
+@api_router.get("/comments/{file_id}", response_model=List[CommentResponse])
+async def get_comments(file_id: str, user_id: str = Depends(get_current_user), users: UserLoader = Depends(get_user_loader)):
+    file_doc = await db.files.find_one({"_id": ObjectId(file_id)}, {"owner_id": 1, "ancestors": 1, "trashed": 1})
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    await authorize(file_doc, user_id, "viewer")
+    comments = await db.comments.find({"file_id": ObjectId(file_id)}, COMMENT_LIST_PROJECTION).to_list(1000)
+    comment_users = await users.load_many(comment["user_id"] for comment in comments)
+    return FastJSONResponse([comment_row(comment, file_id, user) for comment, user in zip(comments, comment_users)])
 
 # ============ ACTIVITY ROUTES ============
 
@@ -563,55 +1832,206 @@ async def log_activity(user_id: str, activity_type: str, item_id: str, descripti
         "description": description,
         "timestamp": datetime.utcnow()
     }
-    await db.activities.insert_one(activity_doc)
-
-@api_router.get("/activities")
-async def get_activities(limit: int = Query(20), offset: int = Query(0), user_id: str = Depends(get_current_user)):
-    activities = await db.activities.find({"user_id": ObjectId(user_id)}).sort("timestamp", -1).skip(offset).limit(limit).to_list(limit)
-    
-    result = []
-    for activity in activities:
-        result.append(ActivityResponse(
-            id=str(activity["_id"]),
-            type=activity["type"],
-            userId=user_id,
-            fileId=str(activity["item_id"]) if activity.get("item_id") else None,
-            description=activity["description"],
-            timestamp=format_datetime(activity["timestamp"])
-        ))
+    # Only waits when the writer's queue is full
+    await activity_writer.write(activity_doc)
+
+# Raw events are compacted into daily summaries after ACTIVITY_ROLLUP_DAYS;
+# ACTIVITY_RETENTION_DAYS (0 = keep forever) is a TTL backstop and should be longer.
+ACTIVITY_ROLLUP_DAYS = int(os.environ.get('ACTIVITY_ROLLUP_DAYS', 90))
+ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS', 0))
+ACTIVITY_ROLLUP_INTERVAL = int(os.environ.get('ACTIVITY_ROLLUP_INTERVAL', 3600))  # seconds
+ACTIVITY_PAGE_SIZE = 100
+
+async def rollup_activities_periodically():
+    while True:
+        try:
+            days = await rollup_activities(db, datetime.utcnow() - timedelta(days=ACTIVITY_ROLLUP_DAYS))
+            if days:
+                logger.info("Rolled up %d days of activity", days)
+        except Exception:
+            logger.exception("Activity rollup failed")
+        await asyncio.sleep(ACTIVITY_ROLLUP_INTERVAL)
+
+@api_router.get("/activities", response_model=List[ActivityResponse])
+async def get_activities(
+    limit: int = Query(20, ge=1, le=ACTIVITY_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    user_id: str = Depends(get_current_user)
+):
+    """Newest-first activity feed; the X-Next-Cursor header continues it."""
+    query = {"user_id": ObjectId(user_id)}
+    if cursor:
+        try:
+            after = cursor_after(decode_cursor(cursor))
+            if after is None:
+                raise InvalidCursor("Invalid cursor")
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        timestamp, last_id = after
+        query = {"$and": [query, keyset_filter("timestamp", DESCENDING, timestamp, last_id)]}
+    
+    activities = await db.activities.find(query, ACTIVITY_LIST_PROJECTION).sort(
+        [("timestamp", DESCENDING), ("_id", DESCENDING)]
+    ).limit(limit + 1).to_list(limit + 1)
+    headers = {}
+    if len(activities) > limit:
+        activities = activities[:limit]
+        last = activities[-1]
+        headers["X-Next-Cursor"] = encode_cursor({"after": [last["timestamp"], last["_id"]]})
     
-    return result
+    return FastJSONResponse([activity_row(activity, user_id) for activity in activities], headers=headers)
+
+@api_router.get("/activities/summary", response_model=List[ActivitySummary])
+async def get_activity_summary(
+    limit: int = Query(30, ge=1, le=ACTIVITY_PAGE_SIZE),
+    before: Optional[str] = Query(None),
+    user_id: str = Depends(get_current_user)
+):
+    """Daily activity counts for days that have been rolled up, newest first."""
+    query = {"user_id": ObjectId(user_id)}
+    if before:
+        try:
+            query["day"] = {"$lt": datetime.fromisoformat(before.rstrip('Z'))}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date")
+    
+    rollups = await db.activity_rollups.find(query).sort("day", DESCENDING).limit(limit).to_list(limit)
+    return [
+        ActivitySummary(day=format_datetime(rollup["day"]), counts=rollup["counts"], total=rollup["total"])
+        for rollup in rollups
+    ]
 
 # ============ STORAGE ROUTES ============
 
-@api_router.get("/storage", response_model=StorageResponse)
-async def get_storage(user_id: str = Depends(get_current_user)):
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+# Each user document keeps storage_used (every file it owns, including trash)
+# and storage_breakdown.<category>.{bytes,count} (files not in trash). Routes
+# update them with $inc as files come and go; reconcile_storage repairs drift.
+STORAGE_CATEGORIES = ("documents", "images", "videos", "other")
+STORAGE_RECONCILE_INTERVAL = int(os.environ.get('STORAGE_RECONCILE_INTERVAL', 6 * 3600))  # seconds
+STORAGE_RECONCILE_BATCH_SIZE = 500
+
+def storage_category(content_type: Optional[str]) -> str:
+    content_type = content_type or ""
+    if "document" in content_type or "pdf" in content_type or "word" in content_type or "sheet" in content_type:
+        return "documents"
+    elif "image" in content_type:
+        return "images"
+    elif "video" in content_type:
+        return "videos"
+    return "other"
+
+def storage_changes(file_doc, sign: int, used: bool = True, breakdown: bool = True) -> dict:
+    """$inc update moving a file into (sign=1) or out of (sign=-1) its owner's counters."""
+    changes = {}
+    if used:
+        changes["storage_used"] = sign * file_doc["size"]
+    if breakdown:
+        category = storage_category(file_doc.get("type"))
+        changes[f"storage_breakdown.{category}.bytes"] = sign * file_doc["size"]
+        changes[f"storage_breakdown.{category}.count"] = sign
+    return changes
+
+# Mirrors storage_category() for the reconciliation aggregation
+STORAGE_CATEGORY_EXPR = {
+    "$switch": {
+        "branches": [
+            {"case": {"$regexMatch": {"input": "$type", "regex": "document|pdf|word|sheet"}}, "then": "documents"},
+            {"case": {"$regexMatch": {"input": "$type", "regex": "image"}}, "then": "images"},
+            {"case": {"$regexMatch": {"input": "$type", "regex": "video"}}, "then": "videos"},
+        ],
+        "default": "other"
+    }
+}
+
+def storage_counter_fields(user: dict) -> dict:
+    """A user's storage counters keyed by dotted path; None where a counter is missing."""
+    breakdown = user.get("storage_breakdown") or {}
+    fields = {"storage_used": user.get("storage_used")}
+    for category in STORAGE_CATEGORIES:
+        for key in ("bytes", "count"):
+            fields[f"storage_breakdown.{category}.{key}"] = (breakdown.get(category) or {}).get(key)
+    return fields
+
+async def reconcile_storage_batch(user_ids: list):
+    """Recompute the storage counters of a batch of users from their files.
     
-    # Calculate breakdown
-    files = await db.files.find({"owner_id": ObjectId(user_id), "trashed": False}).to_list(10000)
-    breakdown = {
-        "documents": 0,
-        "images": 0,
-        "videos": 0,
-        "other": 0
+    Routes keep $inc-ing the counters while the aggregation runs, so each
+    correction is written only if the counters still hold the values read
+    before it. A user whose counters moved in the meantime is left for the
+    next run instead of having those increments overwritten.
+    """
+    snapshot = {
+        user["_id"]: storage_counter_fields(user)
+        for user in await db.users.find(
+            {"_id": {"$in": user_ids}}, {"storage_used": 1, "storage_breakdown": 1}
+        ).to_list(None)
     }
+    totals = await db.files.aggregate([
+        {"$match": {"owner_id": {"$in": list(snapshot)}}},
+        {"$group": {
+            "_id": {"owner_id": "$owner_id", "category": STORAGE_CATEGORY_EXPR, "trashed": "$trashed"},
+            "bytes": {"$sum": "$size"},
+            "count": {"$sum": 1}
+        }}
+    ], allowDiskUse=True).to_list(None)
     
-    for file in files:
-        file_type = file["type"]
-        if "document" in file_type or "pdf" in file_type or "word" in file_type or "sheet" in file_type:
-            breakdown["documents"] += file["size"]
-        elif "image" in file_type:
-            breakdown["images"] += file["size"]
-        elif "video" in file_type:
-            breakdown["videos"] += file["size"]
-        else:
-            breakdown["other"] += file["size"]
+    counters = {
+        uid: {"storage_used": 0, "storage_breakdown": {c: {"bytes": 0, "count": 0} for c in STORAGE_CATEGORIES}}
+        for uid in snapshot
+    }
+    for total in totals:
+        user_counters = counters[total["_id"]["owner_id"]]
+        user_counters["storage_used"] += total["bytes"]
+        if total["_id"].get("trashed") is not True:
+            category = user_counters["storage_breakdown"][total["_id"]["category"]]
+            category["bytes"] += total["bytes"]
+            category["count"] += total["count"]
+    
+    updates = [
+        UpdateOne({"_id": uid, **snapshot[uid]}, {"$set": values})
+        for uid, values in counters.items()
+        if storage_counter_fields(values) != snapshot[uid]
+    ]
+    if updates:
+        result = await db.users.bulk_write(updates, ordered=False)
+        if result.matched_count < len(updates):
+            logger.info("Storage reconciliation skipped %d users with concurrent writes", len(updates) - result.matched_count)
+
+async def reconcile_storage():
+    batch = []
+    async for user in db.users.find({}, {"_id": 1}):
+        batch.append(user["_id"])
+        if len(batch) == STORAGE_RECONCILE_BATCH_SIZE:
+            await reconcile_storage_batch(batch)
+            batch = []
+    if batch:
+        await reconcile_storage_batch(batch)
+
+async def reconcile_storage_periodically():
+    while True:
+        try:
+            await reconcile_storage()
+        except Exception:
+            logger.exception("Storage reconciliation failed")
+        await asyncio.sleep(STORAGE_RECONCILE_INTERVAL)
+
+@api_router.get("/storage", response_model=StorageResponse)
+async def get_storage(user_id: str = Depends(get_current_user)):
+    user = await db.users.find_one(
+        {"_id": ObjectId(user_id)},
+        {"storage_used": 1, "storage_breakdown": 1}
+    )
+    counters = user.get("storage_breakdown", {})
+    
+    # Deduplicated bytes actually on disk across all users
+    physical = await db.blob_stats.find_one({"_id": "physical"})
     
     return StorageResponse(
         used=user.get("storage_used", 0),
         total=107374182400,  # 100 GB
-        breakdown=breakdown
+        breakdown={c: counters.get(c, {}).get("bytes", 0) for c in STORAGE_CATEGORIES},
+        counts={c: counters.get(c, {}).get("count", 0) for c in STORAGE_CATEGORIES},
+        physical=physical["bytes"] if physical else 0
     )
 
 # Include the router in the main app
@@ -623,8 +2043,32 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+background_tasks = []
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await ensure_indexes(db)
+    await ensure_ttl_index(db.activities, "timestamp", ACTIVITY_RETENTION_DAYS * 86400, "timestamp")
+    await backfill_search_keys(db)
+    await backfill_ancestors(db)
+    await backfill_folder_contents(db)
+    load_revoked_tokens(await db.revoked_tokens.find({"expires_at": {"$gt": datetime.utcnow()}}).to_list(None))
+    activity_writer.start()
+    thumbnail_worker.start()
+    background_tasks.append(asyncio.create_task(collect_upload_sessions()))
+    background_tasks.append(asyncio.create_task(collect_blobs()))
+    background_tasks.append(asyncio.create_task(reconcile_storage_periodically()))
+    background_tasks.append(asyncio.create_task(rollup_activities_periodically()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await activity_writer.close()
+    await thumbnail_worker.close()
+    archive_executor.shutdown(wait=False)
     client.close()
\ No newline at end of file
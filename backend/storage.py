@@ -0,0 +1,365 @@
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import uuid
+import zlib
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+MMAP_THRESHOLD = 8 * 1024 * 1024  # 8MB
+
+# Compressible blobs are stored as <sha256>.gz, a single gzip member that is
+# fully flushed every FRAME_SIZE bytes of content. Each frame can be inflated
+# on its own, so a range read decodes at most two frames more than it needs,
+# and the file is still plain gzip that can be sent with Content-Encoding.
+# <sha256>.gzi records where each frame starts.
+FRAME_SIZE = 256 * 1024
+COMPRESSED_SUFFIX = "gz"
+FRAME_INDEX_SUFFIX = "gzi"
+# Content that shrinks by less than this is stored as is
+MIN_COMPRESSION_SAVINGS = 0.1
+
+# Text and other uncompressed formats; images, video, audio, archives and
+# OOXML/ODF documents (which are zip files) are already compressed.
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/xml", "application/javascript", "application/ecmascript",
+    "application/x-ndjson", "application/sql", "application/yaml", "application/x-yaml",
+    "application/x-sh", "application/rtf", "application/postscript", "application/x-tex",
+    "application/msword", "application/vnd.ms-excel", "application/vnd.ms-powerpoint",
+    "application/x-tar", "image/svg+xml",
+}
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith(("+json", "+xml"))
+    )
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class FrameCompressor:
+    """Gzip-compresses a stream into a file, with a full flush every `frame_size` bytes."""
+
+    def __init__(self, path: Path, level: int, frame_size: int = FRAME_SIZE):
+        self.path = path
+        self._fh = open(path, "wb")
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self._frame_size = frame_size
+        self._in_frame = 0
+        self.offsets = [0]
+        self.size = 0
+
+    def write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self._frame_size - self._in_frame)
+            self._emit(self._compressor.compress(view[:take]))
+            self._in_frame += take
+            view = view[take:]
+            if self._in_frame == self._frame_size:
+                self._emit(self._compressor.flush(zlib.Z_FULL_FLUSH))
+                self.offsets.append(self.size)
+                self._in_frame = 0
+
+    def close(self):
+        self._emit(self._compressor.flush())
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+
+    def abort(self):
+        self._fh.close()
+        self.path.unlink(missing_ok=True)
+
+    def _emit(self, data: bytes):
+        self._fh.write(data)
+        self.size += len(data)
+
+
+def pack_frame_index(raw_size: int, frame_size: int, offsets: List[int]) -> bytes:
+    return struct.pack(f"<QQ{len(offsets)}Q", raw_size, frame_size, *offsets)
+
+
+def unpack_frame_index(data: bytes) -> Tuple[int, int, Tuple[int, ...]]:
+    raw_size, frame_size = struct.unpack_from("<QQ", data)
+    return raw_size, frame_size, struct.unpack_from(f"<{len(data) // 8 - 2}Q", data, 16)
+
+
+class BlobWriter:
+    """Writes a blob to a temp file, hashing as it goes, then moves it into place.
+
+    With `compression_level` set the content is also compressed as it is
+    written, and the compressed copy is kept if it is worth it.
+    """
+
+    def __init__(self, store: "BlobStore", compression_level: int = 0):
+        self._store = store
+        self._tmp_path = store.tmp_dir / uuid.uuid4().hex
+        self._fh = open(self._tmp_path, "wb")
+        self._hash = hashlib.sha256()
+        self._frames = None
+        if compression_level:
+            self._frames = FrameCompressor(self._tmp_path.with_suffix(f".{COMPRESSED_SUFFIX}"), compression_level)
+        self.size = 0
+        self.stored_size = None
+        self.digest = None
+
+    def write(self, data: bytes):
+        self._fh.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+        if self._frames:
+            self._frames.write(data)
+
+    def finish(self) -> str:
+        """Flush the content to disk and return its digest, without publishing it."""
+        if self.digest is None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+            if self._frames:
+                self._frames.close()
+                if self._frames.size > self.size * (1 - MIN_COMPRESSION_SAVINGS):
+                    self._frames.abort()
+                    self._frames = None
+            self.stored_size = self._frames.size if self._frames else self.size
+            self.digest = self._hash.hexdigest()
+        return self.digest
+
+    def commit(self) -> str:
+        digest = self.finish()
+        if self._store.exists(digest):
+            # Same content is already stored
+            self._tmp_path.unlink()
+            if self._frames:
+                self._frames.abort()
+        elif self._frames:
+            compressed_path = self._store.compressed_path(digest)
+            compressed_path.parent.mkdir(parents=True, exist_ok=True)
+            # The index goes first: a visible .gz always has its frame index
+            self._store._write_atomic(
+                self._store.frame_index_path(digest),
+                pack_frame_index(self.size, FRAME_SIZE, self._frames.offsets + [self._frames.size])
+            )
+            os.replace(self._frames.path, compressed_path)
+            self._tmp_path.unlink()
+        else:
+            final_path = self._store.path_for(digest)
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._tmp_path, final_path)
+        return digest
+
+    def abort(self):
+        self._fh.close()
+        self._tmp_path.unlink(missing_ok=True)
+        if self._frames:
+            self._frames.abort()
+
+
+class PartWriter:
+    """Writes one chunk of an upload session; the part only appears once committed."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        self._fh = open(self._tmp_path, "wb")
+        self.size = 0
+
+    def write(self, data: bytes):
+        self._fh.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        os.replace(self._tmp_path, self._path)
+
+    def abort(self):
+        self._fh.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class BlobStore:
+    """Content-addressed blob store: blobs live at <root>/<aa>/<bb>/<sha256>.
+
+    Compressed blobs live beside them as <sha256>.gz (see FRAME_SIZE); reads
+    return the original bytes either way.
+    """
+
+    def __init__(self, root, compression_level: int = 1):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.compression_level = compression_level
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def compressed_path(self, digest: str) -> Path:
+        return self.rendition_path(digest, COMPRESSED_SUFFIX)
+
+    def frame_index_path(self, digest: str) -> Path:
+        return self.rendition_path(digest, FRAME_INDEX_SUFFIX)
+
+    def writer(self, content_type: Optional[str] = None) -> BlobWriter:
+        """A writer for new content; compressible content types are compressed."""
+        return BlobWriter(self, self.compression_level if is_compressible(content_type) else 0)
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists() or self.compressed_path(digest).exists()
+
+    def is_compressed(self, digest: str) -> bool:
+        return not self.path_for(digest).exists() and self.compressed_path(digest).exists()
+
+    def size(self, digest: str) -> int:
+        """Size of the original content."""
+        try:
+            return self.path_for(digest).stat().st_size
+        except FileNotFoundError:
+            return self._frame_index(digest)[0]
+
+    def stored_size(self, digest: str) -> int:
+        """Bytes the blob takes on disk."""
+        try:
+            return self.path_for(digest).stat().st_size
+        except FileNotFoundError:
+            pass
+        try:
+            return self.compressed_path(digest).stat().st_size
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def _frame_index(self, digest: str) -> Tuple[int, int, Tuple[int, ...]]:
+        try:
+            return unpack_frame_index(self.frame_index_path(digest).read_bytes())
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def iter_range(self, digest: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the bytes in [start, end) of a blob.
+
+        Large blobs are memory-mapped so chunks are served from the page cache
+        without a read() per chunk. Compressed blobs yield one decoded frame
+        at a time.
+        """
+        try:
+            fh = open(self.path_for(digest), "rb")
+        except FileNotFoundError:
+            yield from self._iter_compressed_range(digest, start, end)
+            return
+
+        with fh:
+            file_size = os.fstat(fh.fileno()).st_size
+            end = file_size if end is None else min(end, file_size)
+            if start >= end:
+                return
+
+            if file_size >= MMAP_THRESHOLD:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for offset in range(start, end, chunk_size):
+                        yield mm[offset:min(offset + chunk_size, end)]
+            else:
+                fh.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    data = fh.read(min(chunk_size, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+
+    def _iter_compressed_range(self, digest: str, start: int, end: Optional[int]) -> Iterator[bytes]:
+        raw_size, frame_size, offsets = self._frame_index(digest)
+        end = raw_size if end is None else min(end, raw_size)
+        if start >= end:
+            return
+        try:
+            fh = open(self.compressed_path(digest), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+        with fh:
+            for frame in range(start // frame_size, (end - 1) // frame_size + 1):
+                fh.seek(offsets[frame])
+                # The first frame carries the gzip header; later ones are raw deflate
+                decompressor = zlib.decompressobj(31 if frame == 0 else -15)
+                data = decompressor.decompress(fh.read(offsets[frame + 1] - offsets[frame]))
+                frame_start = frame * frame_size
+                yield data[max(start - frame_start, 0):end - frame_start]
+
+    def iter_compressed(self, digest: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield a compressed blob as stored: a gzip stream of the whole content."""
+        try:
+            fh = open(self.compressed_path(digest), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+        with fh:
+            while True:
+                data = fh.read(chunk_size)
+                if not data:
+                    break
+                yield data
+
+    def delete(self, digest: str):
+        path = self.path_for(digest)
+        path.unlink(missing_ok=True)
+        for rendition in path.parent.glob(f"{digest}.*"):
+            rendition.unlink(missing_ok=True)
+
+    # Derived renditions (thumbnails) live beside their blob as <sha256>.<name>
+    # and go away with it.
+
+    def rendition_path(self, digest: str, name: str) -> Path:
+        return self.path_for(digest).with_name(f"{digest}.{name}")
+
+    def put_rendition(self, digest: str, name: str, data: bytes):
+        self._write_atomic(self.rendition_path(digest, name), data)
+
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    # Upload sessions keep their parts under <root>/sessions/<session_id>/<index>
+
+    def session_dir(self, session_id: str) -> Path:
+        return self.root / "sessions" / session_id
+
+    def part_writer(self, session_id: str, index: int) -> PartWriter:
+        session_dir = self.session_dir(session_id)
+        session_dir.mkdir(parents=True, exist_ok=True)
+        return PartWriter(session_dir / str(index))
+
+    def assemble(self, session_id: str, part_count: int, writer: BlobWriter) -> str:
+        """Concatenate the parts of a session, in order, into `writer`.
+
+        Returns the digest; the caller still has to commit the writer.
+        """
+        session_dir = self.session_dir(session_id)
+        try:
+            for index in range(part_count):
+                with open(session_dir / str(index), "rb") as fh:
+                    while True:
+                        data = fh.read(CHUNK_SIZE)
+                        if not data:
+                            break
+                        writer.write(data)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.finish()
+
+    def delete_session(self, session_id: str):
+        shutil.rmtree(self.session_dir(session_id), ignore_errors=True)
@@ -0,0 +1,164 @@
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional; without it no thumbnails are made
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def thumbnails_available() -> bool:
+    return Image is not None
+
+
+def thumbnail_format() -> Optional[str]:
+    """WebP where Pillow was built with it, JPEG otherwise."""
+    if Image is None:
+        return None
+    return "webp" if features.check("webp") else "jpeg"
+
+
+def rendition_name(size: int) -> str:
+    return f"thumb-{size}.{thumbnail_format()}"
+
+
+def pick_size(sizes: Iterable[int], requested: int) -> int:
+    """The smallest rendition at least `requested` pixels, or the largest one."""
+    sizes = sorted(sizes)
+    return next((size for size in sizes if size >= requested), sizes[-1])
+
+
+def render_thumbnails(store, digest: str, sizes: Iterable[int], max_pixels: int):
+    """Write every rendition of an image blob beside it. Blocking; run it in a worker thread."""
+    fmt = thumbnail_format()
+    sizes = sorted(sizes, reverse=True)
+    try:
+        with Image.open(store.path_for(digest)) as image:
+            if image.width * image.height > max_pixels:
+                raise ThumbnailError(f"{image.width}x{image.height} image is too large to thumbnail")
+            # JPEGs decode straight to a reduced scale, so big photos stay cheap
+            image.draft("RGB", (sizes[0], sizes[0]))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha and fmt == "webp" else "RGB")
+    except ThumbnailError:
+        raise
+    except Exception as e:
+        raise ThumbnailError(str(e)) from e
+
+    # Largest first; each smaller rendition is scaled down from the previous one
+    for size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if fmt == "webp":
+            image.save(buffer, "WEBP", quality=80, method=4)
+        else:
+            image.save(buffer, "JPEG", quality=82, optimize=True, progressive=True)
+        store.put_rendition(digest, rendition_name(size), buffer.getvalue())
+
+
+class ThumbnailWorker:
+    """Renders image thumbnails in the background after uploads.
+
+    submit() never blocks an upload: jobs beyond `max_queue` are dropped and
+    rendered on demand the first time their thumbnail is requested. Rendering
+    runs on a small thread pool; render() lets a request wait for a blob that
+    is missing its renditions, sharing work already in flight.
+    """
+
+    def __init__(self, store, sizes: Iterable[int], on_rendered, workers: int = 2,
+                 max_queue: int = 1000, max_pixels: int = 50_000_000):
+        self._store = store
+        self._sizes = tuple(sizes)
+        self._on_rendered = on_rendered
+        self._workers = workers
+        self._max_pixels = max_pixels
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._in_flight = {}
+        self._tasks = []
+        self._stats = {"submitted": 0, "dropped": 0, "rendered": 0, "failed": 0, "total_render_ms": 0.0}
+
+    def start(self):
+        if not thumbnails_available():
+            logger.warning("Pillow is not installed; image thumbnails are disabled")
+            return
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self._workers)]
+
+    def submit(self, file_id, blob_id: str):
+        if not self._tasks:
+            return
+        try:
+            self._queue.put_nowait((file_id, blob_id))
+            self._stats["submitted"] += 1
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+
+    async def render(self, blob_id: str):
+        """Render a blob's thumbnails, or wait for a render already running. Raises ThumbnailError."""
+        if not thumbnails_available():
+            raise ThumbnailError("Thumbnails are disabled")
+        future = self._in_flight.get(blob_id)
+        if future is None:
+            future = asyncio.ensure_future(self._render(blob_id))
+            self._in_flight[blob_id] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(blob_id, None))
+        await asyncio.shield(future)
+
+    async def close(self):
+        for _ in self._tasks:
+            await self._queue.put(_STOP)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        rendered = self._stats["rendered"]
+        return {
+            **self._stats,
+            "enabled": thumbnails_available(),
+            "format": thumbnail_format(),
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "avg_render_ms": self._stats["total_render_ms"] / rendered if rendered else 0.0,
+        }
+
+    async def _render(self, blob_id: str):
+        started = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, render_thumbnails, self._store, blob_id, self._sizes, self._max_pixels
+            )
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        self._stats["rendered"] += 1
+        self._stats["total_render_ms"] += (time.perf_counter() - started) * 1000
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            if job is _STOP:
+                return
+            file_id, blob_id = job
+            try:
+                # Identical images share renditions, so only render the first copy
+                if not self._store.rendition_path(blob_id, rendition_name(min(self._sizes))).exists():
+                    await self.render(blob_id)
+                await self._on_rendered(file_id)
+            except ThumbnailError as e:
+                logger.info("No thumbnail for blob %s: %s", blob_id, e)
+            except Exception:
+                logger.exception("Thumbnail rendering failed for blob %s", blob_id)
@@ -8,6 +8,7 @@ import requests
 import json
 import os
 import io
+import zipfile
 from datetime import datetime
 
 # Configuration
@@ -51,6 +52,8 @@ def make_request(method, endpoint, data=None, files=None, headers=None):
                 response = requests.post(url, files=files, data=data, headers=headers)
             else:
                 response = requests.post(url, json=data, headers=headers)
+        elif method.upper() == "PUT":
+            response = requests.put(url, data=data, headers=headers)
         elif method.upper() == "PATCH":
             response = requests.patch(url, json=data, headers=headers)
         elif method.upper() == "DELETE":
@@ -152,6 +155,41 @@ def test_folders():
     
     return True
 
+def test_folder_path_and_tree():
+    """Test breadcrumb paths and that the cached folder tree follows creates and trashes"""
+    ids = []
+    for name in ["Path A", "Path B", "Path C"]:
+        response = make_request("POST", "/folders", {"name": name, "parentId": ids[-1] if ids else None})
+        if not (response and response.status_code == 200):
+            print_test_result("GET /api/folders/{id}/path", False, "Could not create folder")
+            return
+        ids.append(response.json()["id"])
+    
+    response = make_request("GET", f"/folders/{ids[-1]}/path")
+    path = response.json() if response and response.status_code == 200 else []
+    chain = [(node["id"], node["name"], node["parentId"]) for node in path]
+    expected = [(ids[0], "Path A", None), (ids[1], "Path B", ids[0]), (ids[2], "Path C", ids[1])]
+    print_test_result("GET /api/folders/{id}/path", chain == expected, f"Path: {[node['name'] for node in path]}")
+    
+    def tree():
+        response = make_request("GET", "/folders/tree")
+        return response.headers.get("etag"), {folder["id"] for folder in response.json()["folders"]}
+    
+    etag, before = tree()
+    unchanged = make_request("GET", "/folders/tree", headers={"If-None-Match": etag}).status_code == 304
+    new_id = make_request("POST", "/folders", {"name": "Tree Leaf", "parentId": ids[-1]}).json()["id"]
+    created_etag, after_create = tree()
+    make_request("DELETE", f"/items/{new_id}")
+    _, after_trash = tree()
+    success = (
+        set(ids) <= before and unchanged
+        and created_etag != etag and new_id in after_create
+        and new_id not in after_trash and set(ids) <= after_trash
+    )
+    print_test_result("GET /api/folders/tree", success, f"{len(before)} -> {len(after_create)} -> {len(after_trash)} folders")
+    
+    make_request("DELETE", f"/items/{ids[0]}?permanent=true")
+
 def test_files():
     """Test file operations"""
     global test_file_id
@@ -187,6 +225,45 @@ def test_files():
             error_msg = response.json().get("detail", "Unknown error") if response else "No response"
             print_test_result(f"POST /api/files/upload ({filename})", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
 
+def test_resumable_upload():
+    """Test resumable upload sessions"""
+    chunk_size = 256 * 1024
+    content = os.urandom(chunk_size * 2 + 1000)
+    session_data = {"name": "resumable.bin", "type": "application/octet-stream", "size": len(content), "chunkSize": chunk_size}
+    if test_folder_id:
+        session_data["folderId"] = test_folder_id
+    
+    response = make_request("POST", "/uploads", session_data)
+    if not (response and response.status_code == 200):
+        error_msg = response.json().get("detail", "Unknown error") if response else "No response"
+        print_test_result("POST /api/uploads", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
+        return
+    session = response.json()
+    print_test_result("POST /api/uploads", True, f"Session created with {session.get('totalChunks')} chunks")
+    
+    # Send chunks out of order
+    for index in reversed(range(session["totalChunks"])):
+        chunk = content[index * chunk_size:(index + 1) * chunk_size]
+        response = make_request("PUT", f"/uploads/{session['id']}/chunks/{index}", data=chunk)
+        if not (response and response.status_code == 200):
+            print_test_result(f"PUT /api/uploads/{{id}}/chunks/{index}", False, f"Status: {response.status_code if response else 'N/A'}")
+            return
+    
+    response = make_request("GET", f"/uploads/{session['id']}")
+    if response and response.status_code == 200 and response.json().get("receivedBytes") == len(content):
+        print_test_result("GET /api/uploads/{id}", True, f"Received chunks: {response.json().get('receivedChunks')}")
+    else:
+        print_test_result("GET /api/uploads/{id}", False, f"Status: {response.status_code if response else 'N/A'}")
+    
+    response = make_request("POST", f"/uploads/{session['id']}/complete")
+    if response and response.status_code == 200 and response.json().get("size") == len(content):
+        download = make_request("GET", f"/files/{response.json()['id']}/download")
+        matches = download is not None and download.content == content
+        print_test_result("POST /api/uploads/{id}/complete", matches, f"File created: {response.json().get('name')}, content matches: {matches}")
+    else:
+        error_msg = response.json().get("detail", "Unknown error") if response else "No response"
+        print_test_result("POST /api/uploads/{id}/complete", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
+
 def test_file_download():
     """Test file download"""
     if not test_file_id:
@@ -201,6 +278,60 @@ def test_file_download():
         error_msg = response.json().get("detail", "Unknown error") if response else "No response"
         print_test_result("GET /api/files/{id}/download", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
 
+def test_download_ranges():
+    """Test Range and conditional requests on file download"""
+    if not test_file_id:
+        print_test_result("GET /api/files/{id}/download (Range)", False, "No test file ID available")
+        return
+    
+    full = make_request("GET", f"/files/{test_file_id}/download")
+    if not (full and full.status_code == 200):
+        print_test_result("GET /api/files/{id}/download (Range)", False, "Could not download test file")
+        return
+    
+    response = make_request("GET", f"/files/{test_file_id}/download", headers={"Range": "bytes=0-9"})
+    if response and response.status_code == 206 and response.content == full.content[:10]:
+        print_test_result("GET /api/files/{id}/download (Range)", True, f"Content-Range: {response.headers.get('content-range')}")
+    else:
+        print_test_result("GET /api/files/{id}/download (Range)", False, f"Status: {response.status_code if response else 'N/A'}")
+    
+    response = make_request("GET", f"/files/{test_file_id}/download", headers={"Range": "bytes=0-1,4-5"})
+    if response and response.status_code == 206 and response.headers.get("content-type", "").startswith("multipart/byteranges"):
+        print_test_result("GET /api/files/{id}/download (multi-range)", True, f"Content-Type: {response.headers.get('content-type')}")
+    else:
+        print_test_result("GET /api/files/{id}/download (multi-range)", False, f"Status: {response.status_code if response else 'N/A'}")
+    
+    etag = full.headers.get("etag")
+    response = make_request("GET", f"/files/{test_file_id}/download", headers={"If-None-Match": etag or ""})
+    if etag and response and response.status_code == 304:
+        print_test_result("GET /api/files/{id}/download (If-None-Match)", True, f"ETag {etag} revalidated")
+    else:
+        print_test_result("GET /api/files/{id}/download (If-None-Match)", False, f"ETag: {etag}, Status: {response.status_code if response else 'N/A'}")
+
+def test_text_preview():
+    """Test paged text previews, including bytes that are not valid UTF-8"""
+    content = "".join(f"line {i} h\u00e9llo\n" for i in range(200)).encode() + b"bad \xff byte\n"
+    files = {"file": ("preview_log.txt", io.BytesIO(content), "text/plain")}
+    response = make_request("POST", "/files/upload", files=files)
+    if not (response and response.status_code == 200):
+        print_test_result("GET /api/files/{id}/preview (text)", False, "Could not upload text file")
+        return
+    file_id = response.json()["id"]
+    
+    pages, offset = [], 0
+    while offset is not None and len(pages) < 100:
+        response = make_request("GET", f"/files/{file_id}/preview", data={"offset": offset, "length": 256})
+        if not (response and response.status_code == 200):
+            break
+        page = response.json()
+        pages.append(page["preview"])
+        offset = page["nextOffset"]
+    
+    text = "".join(pages)
+    success = offset is None and all(page.endswith("\n") for page in pages) and text == content.decode("utf-8", "replace")
+    print_test_result("GET /api/files/{id}/preview (text)", success, f"{len(pages)} pages cut at line boundaries")
+    make_request("DELETE", f"/items/{file_id}?permanent=true")
+
 def test_drive_views():
     """Test different drive views"""
     print("👁️ TESTING DRIVE VIEWS")
@@ -220,6 +351,55 @@ def test_drive_views():
             error_msg = response.json().get("detail", "Unknown error") if response else "No response"
             print_test_result(f"GET /api/drive/items?view={view}", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
 
+def test_drive_pagination():
+    """Test cursor pagination of drive listings"""
+    params = {"view": "drive", "folderId": test_folder_id, "sort": "name", "limit": 1} if test_folder_id else {"view": "drive", "limit": 1}
+    
+    names = []
+    for _ in range(50):
+        response = make_request("GET", "/drive/items", data=params)
+        if not (response and response.status_code == 200):
+            print_test_result("GET /api/drive/items (paginated)", False, f"Status: {response.status_code if response else 'N/A'}")
+            return
+        data = response.json()
+        names += [item["name"] for item in data.get("folders", []) + data.get("files", [])]
+        if not data.get("nextCursor"):
+            break
+        params["cursor"] = data["nextCursor"]
+    
+    no_duplicates = len(names) == len(set(names))
+    print_test_result("GET /api/drive/items (paginated)", no_duplicates, f"Walked {len(names)} items one page at a time")
+
+def test_drive_size_sort():
+    """Test that size-sorted listings order folders by their contents' size"""
+    response = make_request("POST", "/folders", {"name": "Size Sort Parent"})
+    if not (response and response.status_code == 200):
+        print_test_result("GET /api/drive/items?sort=size", False, "Could not create folder")
+        return
+    parent_id = response.json()["id"]
+    for name, size in [("Medium", 2000), ("Empty", 0), ("Large", 5000), ("Small", 10)]:
+        folder_id = make_request("POST", "/folders", {"name": name, "parentId": parent_id}).json()["id"]
+        if size:
+            files = {"file": (f"{name}.bin", io.BytesIO(b"x" * size), "application/octet-stream")}
+            make_request("POST", "/files/upload", data={"folderId": folder_id}, files=files)
+    
+    # One folder per page, so the cursor carries the folder size across pages
+    params = {"view": "drive", "folderId": parent_id, "sort": "size", "order": "desc", "limit": 1}
+    folders = []
+    for _ in range(10):
+        response = make_request("GET", "/drive/items", data=params)
+        if not (response and response.status_code == 200):
+            break
+        data = response.json()
+        folders += [(folder["name"], folder["size"]) for folder in data.get("folders", [])]
+        if not data.get("nextCursor"):
+            break
+        params["cursor"] = data["nextCursor"]
+    success = folders == [("Large", 5000), ("Medium", 2000), ("Small", 10), ("Empty", 0)]
+    print_test_result("GET /api/drive/items?sort=size", success, f"Folders: {folders}")
+    
+    make_request("DELETE", f"/items/{parent_id}?permanent=true")
+
 def test_search():
     """Test search functionality"""
     response = make_request("GET", "/drive/items?view=drive&search=test")
@@ -286,6 +466,158 @@ def test_trash_operations():
         error_msg = response.json().get("detail", "Unknown error") if response else "No response"
         print_test_result("POST /api/items/{id}/restore", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
 
+def test_folder_subtree_trash():
+    """Test that trashing a folder hides its contents and restoring brings them back"""
+    response = make_request("POST", "/folders", {"name": "Subtree Parent"})
+    if not (response and response.status_code == 200):
+        print_test_result("DELETE /api/items/{id} (folder subtree)", False, "Could not create folder")
+        return
+    parent_id = response.json()["id"]
+    child_id = make_request("POST", "/folders", {"name": "Subtree Child", "parentId": parent_id}).json()["id"]
+    files = {"file": ("subtree_note.txt", io.BytesIO(b"nested content"), "text/plain")}
+    make_request("POST", "/files/upload", data={"folderId": child_id}, files=files)
+    search_params = {"view": "drive", "folderId": child_id, "search": "subtree note"}
+    found = make_request("GET", "/drive/items", data=search_params).json()
+    
+    make_request("DELETE", f"/items/{parent_id}")
+    trash = make_request("GET", "/drive/items", data={"view": "trash"}).json()
+    trashed_ids = [item["id"] for item in trash.get("folders", []) + trash.get("files", [])]
+    search = make_request("GET", "/drive/items", data=search_params).json()
+    hidden = (
+        len(found.get("files", [])) == 1
+        and parent_id in trashed_ids and child_id not in trashed_ids
+        and not search.get("files")
+    )
+    print_test_result("DELETE /api/items/{id} (folder subtree)", hidden, "Descendants hidden with their folder")
+    
+    child_restore = make_request("POST", f"/items/{child_id}/restore")
+    response = make_request("POST", f"/items/{parent_id}/restore")
+    restored = make_request("GET", "/drive/items", data={"view": "drive", "folderId": child_id}).json()
+    success = child_restore.status_code == 400 and response.status_code == 200 and len(restored.get("files", [])) == 1
+    print_test_result("POST /api/items/{id}/restore (folder subtree)", success, "Descendants restored with their folder")
+    
+    response = make_request("DELETE", f"/items/{parent_id}?permanent=true")
+    print_test_result("DELETE /api/items/{id}?permanent=true (folder subtree)", response.status_code == 200, "Folder and contents deleted")
+
+def test_batch_items():
+    """Test batch moves, trashing and restoring a folder with its child, and permanent deletes"""
+    response = make_request("POST", "/folders", {"name": "Batch Root"})
+    if not (response and response.status_code == 200):
+        print_test_result("POST /api/items/batch", False, "Could not create folder")
+        return
+    root_id = response.json()["id"]
+    parent_id = make_request("POST", "/folders", {"name": "Batch Parent", "parentId": root_id}).json()["id"]
+    child_id = make_request("POST", "/folders", {"name": "Batch Child", "parentId": parent_id}).json()["id"]
+    for name, size, folder_id in [("parent.txt", 3000, parent_id), ("child.txt", 1000, child_id)]:
+        files = {"file": (name, io.BytesIO(b"b" * size), "text/plain")}
+        make_request("POST", "/files/upload", data={"folderId": folder_id}, files=files)
+    
+    def listing(folder_id=None, view="drive"):
+        params = {"view": view, "limit": 1000}
+        if folder_id:
+            params["folderId"] = folder_id
+        data = make_request("GET", "/drive/items", data=params).json()
+        return {item["name"]: item for item in data.get("folders", []) + data.get("files", [])}
+    
+    def batch(operation, ids, **extra):
+        response = make_request("POST", "/items/batch", {"ids": ids, "operation": operation, **extra})
+        return response.json() if response and response.status_code == 200 else {}
+    
+    # A folder cannot go into itself or anything below it
+    results = [
+        batch("move", [parent_id], folderId=parent_id),
+        batch("move", [parent_id], folderId=child_id),
+    ]
+    success = (
+        all(result.get("failed") == 1 and result["results"][0]["error"] for result in results)
+        and "Batch Parent" in listing(root_id)
+        and "Batch Child" in listing(parent_id)
+    )
+    print_test_result("POST /api/items/batch (move into itself)", success, f"Results: {[result.get('results') for result in results]}")
+    
+    # The child goes to trash hidden under its folder (trashed_by) and comes back with it
+    trashed = batch("trash", [parent_id, child_id])
+    root_after_trash = listing()["Batch Root"]
+    trash_view = listing(view="trash")
+    restored = batch("restore", [parent_id, child_id])
+    root_after_restore = listing()["Batch Root"]
+    success = (
+        trashed.get("succeeded") == 2
+        and (root_after_trash["size"], root_after_trash["itemCount"]) == (0, 0)
+        and "Batch Parent" in trash_view and "Batch Child" not in trash_view and "child.txt" not in trash_view
+        and restored.get("succeeded") == 2 and restored.get("failed") == 0
+        and (root_after_restore["size"], root_after_restore["itemCount"]) == (4000, 4)
+        and set(listing(parent_id)) == {"Batch Child", "parent.txt"}
+        and set(listing(child_id)) == {"child.txt"}
+    )
+    print_test_result(
+        "POST /api/items/batch (trash and restore)", success,
+        f"Trash: {trashed}, Restore: {restored}, Root contents: {root_after_trash['size']} -> {root_after_restore['size']} bytes"
+    )
+    
+    # Permanent deletion gives the storage back
+    used_before = make_request("GET", "/storage").json()["used"]
+    deleted = batch("delete", [parent_id])
+    used_after = make_request("GET", "/storage").json()["used"]
+    root_after_delete = listing()["Batch Root"]
+    success = (
+        deleted.get("succeeded") == 1
+        and used_before - used_after == 4000
+        and (root_after_delete["size"], root_after_delete["itemCount"]) == (0, 0)
+        and not listing(root_id)
+    )
+    print_test_result("POST /api/items/batch (delete)", success, f"Storage used: {used_before} -> {used_after} bytes")
+    
+    make_request("DELETE", f"/items/{root_id}?permanent=true")
+
+def test_folder_archive():
+    """Test ZIP downloads of a folder and of a multi-selection"""
+    response = make_request("POST", "/folders", {"name": "Archive Parent"})
+    if not (response and response.status_code == 200):
+        print_test_result("GET /api/folders/{id}/archive", False, "Could not create folder")
+        return
+    parent_id = response.json()["id"]
+    child_id = make_request("POST", "/folders", {"name": "Archive Child", "parentId": parent_id}).json()["id"]
+    files = {"file": ("notes.txt", io.BytesIO(b"archived notes\n" * 1000), "text/plain")}
+    make_request("POST", "/files/upload", data={"folderId": child_id}, files=files)
+    files = {"file": ("photo.jpg", io.BytesIO(b"\xff\xd8 not really a jpeg"), "image/jpeg")}
+    photo_id = make_request("POST", "/files/upload", data={"folderId": parent_id}, files=files).json()["id"]
+    
+    response = make_request("GET", f"/folders/{parent_id}/archive")
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        names = set(archive.namelist())
+        success = (
+            archive.testzip() is None
+            and archive.read("Archive Parent/Archive Child/notes.txt") == b"archived notes\n" * 1000
+            and "Archive Parent/photo.jpg" in names
+        )
+    except (zipfile.BadZipFile, KeyError, AttributeError):
+        success, names = False, set()
+    print_test_result("GET /api/folders/{id}/archive", success, f"Entries: {sorted(names)}")
+    
+    response = make_request("POST", "/items/archive", {"ids": [child_id, photo_id], "name": "Selection"})
+    try:
+        names = set(zipfile.ZipFile(io.BytesIO(response.content)).namelist())
+        success = names == {"Archive Child/", "Archive Child/notes.txt", "photo.jpg"}
+    except (zipfile.BadZipFile, AttributeError):
+        success = False
+    print_test_result("POST /api/items/archive", success, f"Entries: {sorted(names)}")
+    
+    # Names outside latin-1 go in filename*; more requests than the server
+    # has archive slots shows none of them is left holding one
+    statuses, dispositions = [], set()
+    for _ in range(6):
+        response = make_request("POST", "/items/archive", {"ids": [photo_id], "name": "照片 ✓"})
+        statuses.append(response.status_code if response else None)
+        dispositions.add(response.headers.get("content-disposition") if response else None)
+    success = statuses == [200] * 6 and dispositions == {
+        "attachment; filename=\"download.zip\"; filename*=UTF-8''%E7%85%A7%E7%89%87%20%E2%9C%93.zip"
+    }
+    print_test_result("POST /api/items/archive (unicode name)", success, f"Statuses: {statuses}, Disposition: {dispositions}")
+    
+    make_request("DELETE", f"/items/{parent_id}?permanent=true")
+
 def test_sharing():
     """Test sharing operations"""
     print("🤝 TESTING SHARING")
@@ -337,6 +669,31 @@ def test_sharing():
         error_msg = response.json().get("detail", "Unknown error") if response else "No response"
         print_test_result("GET /api/shares/{itemId}", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
 
+def test_inherited_share():
+    """Test that sharing a folder grants access to the files inside it"""
+    global auth_token
+    
+    if not test_folder_id or not test_file_id:
+        print_test_result("Inherited folder share", False, "No test folder or file available")
+        return
+    
+    make_request("POST", "/shares", {"itemId": test_folder_id, "email": "john.doe@example.com", "permission": "viewer"})
+    response = make_request("POST", "/auth/login", {"email": "john.doe@example.com", "password": "password456"})
+    if not (response and response.status_code == 200):
+        print_test_result("Inherited folder share", False, "Could not sign in as the second user")
+        return
+    
+    owner_token, auth_token = auth_token, response.json()["token"]
+    try:
+        download = make_request("GET", f"/files/{test_file_id}/download")
+        comment = make_request("POST", "/comments", {"fileId": test_file_id, "text": "Viewer comment"})
+    finally:
+        auth_token = owner_token
+    
+    success = download.status_code == 200 and comment.status_code == 403
+    print_test_result("Inherited folder share", success,
+                      f"Download: {download.status_code}, comment as viewer: {comment.status_code}")
+
 def test_comments():
     """Test comment operations"""
     print("💬 TESTING COMMENTS")
@@ -389,6 +746,20 @@ def test_storage():
         error_msg = response.json().get("detail", "Unknown error") if response else "No response"
         print_test_result("GET /api/storage", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
 
+def test_malformed_ids():
+    """Test that malformed ids in paths and bodies are rejected rather than failing with 500"""
+    checks = [
+        ("POST /api/items/batch (malformed target)", "POST", "/items/batch",
+         {"ids": [test_folder_id or "x"], "operation": "move", "folderId": "not-an-id"}, 404),
+        ("GET /api/files/{id}/thumbnail (malformed id)", "GET", "/files/not-an-id/thumbnail", None, 404),
+        ("GET /api/folders/{id}/archive (malformed id)", "GET", "/folders/not-an-id/archive", None, 404),
+        ("GET /api/uploads/{id} (malformed id)", "GET", "/uploads/not-an-id", None, 404),
+    ]
+    for name, method, endpoint, data, expected in checks:
+        response = make_request(method, endpoint, data)
+        status = response.status_code if response else None
+        print_test_result(name, status == expected, f"Status: {status}, expected {expected}")
+
 def cleanup_shares():
     """Clean up test shares"""
     if test_share_id:
@@ -399,6 +770,25 @@ def cleanup_shares():
             error_msg = response.json().get("detail", "Unknown error") if response else "No response"
             print_test_result("DELETE /api/shares/{shareId}", False, f"Status: {response.status_code if response else 'N/A'}, Error: {error_msg}")
 
+def test_logout():
+    """Test that a token is refused once logged out
+
+    Tokens issued in the same second are identical, so this runs last:
+    revoking a fresh login could also revoke auth_token.
+    """
+    login_data = {"email": TEST_USER["email"], "password": TEST_USER["password"]}
+    try:
+        token = requests.post(f"{BASE_URL}/auth/login", json=login_data).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        before = requests.get(f"{BASE_URL}/auth/me", headers=headers).status_code
+        logout = requests.post(f"{BASE_URL}/auth/logout", headers=headers).status_code
+        after = requests.get(f"{BASE_URL}/auth/me", headers=headers).status_code
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        print_test_result("POST /api/auth/logout", False, f"Request failed: {e}")
+        return
+    success = (before, logout, after) == (200, 200, 401)
+    print_test_result("POST /api/auth/logout", success, f"/auth/me before: {before}, logout: {logout}, /auth/me after: {after}")
+
 def main():
     """Run all tests"""
     print("🚀 GOOGLE DRIVE CLONE - BACKEND API TESTING")
@@ -419,18 +809,30 @@ def main():
     
     # Core functionality tests
     test_folders()
+    test_folder_path_and_tree()
     test_files()
+    test_resumable_upload()
     test_file_download()
+    test_download_ranges()
+    test_text_preview()
     test_drive_views()
+    test_drive_pagination()
+    test_drive_size_sort()
     test_search()
     test_item_updates()
     test_trash_operations()
+    test_folder_subtree_trash()
+    test_batch_items()
+    test_folder_archive()
     test_sharing()
+    test_inherited_share()
     test_comments()
     test_storage()
+    test_malformed_ids()
     
     # Cleanup
     cleanup_shares()
+    test_logout()
     
     print("🏁 TESTING COMPLETED")
     print("=" * 60)
@@ -57,6 +57,8 @@ export const files = {
   },
   download: (fileId) => client.get(`/files/${fileId}/download`, { responseType: 'blob' }),
   preview: (fileId) => client.get(`/files/${fileId}/preview`),
+  // Thumbnail URLs are paths on the backend ("/api/files/..."), not under API_BASE
+  thumbnail: (url) => client.get(url, { baseURL: process.env.REACT_APP_BACKEND_URL, responseType: 'blob' }),
 };
 
 export const items = {
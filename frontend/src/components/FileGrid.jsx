@@ -9,6 +9,7 @@ import {
   DropdownMenuTrigger,
 } from './ui/dropdown-menu';
 import { Button } from './ui/button';
+import Thumbnail from './Thumbnail';
 
 const FileGrid = ({ items, viewMode, onItemClick, onItemAction, itemType = 'mixed' }) => {
   const getFileTypeIcon = (type) => {
@@ -45,10 +46,13 @@ const FileGrid = ({ items, viewMode, onItemClick, onItemAction, itemType = 'mixe
                 <div className="col-span-5 flex items-center gap-3">
                   {isFolder ? (
                     <Folder className="w-5 h-5 text-gray-400" />
-                  ) : item.thumbnail ? (
-                    <img src={item.thumbnail} alt={item.name} className="w-8 h-8 object-cover rounded" />
                   ) : (
-                    <Icon className="w-5 h-5 text-gray-400" />
+                    <Thumbnail
+                      src={item.thumbnail}
+                      alt={item.name}
+                      className="w-8 h-8 object-cover rounded"
+                      fallback={<Icon className="w-5 h-5 text-gray-400" />}
+                    />
                   )}
                   <span className="text-sm text-gray-900 truncate">{item.name}</span>
                   {item.starred && <Star className="w-4 h-4 text-yellow-500 fill-yellow-500" />}
@@ -145,10 +149,13 @@ const FileGrid = ({ items, viewMode, onItemClick, onItemAction, itemType = 'mixe
             <div className="flex flex-col items-center gap-3">
               {isFolder ? (
                 <Folder className="w-16 h-16 text-gray-400" />
-              ) : item.thumbnail ? (
-                <img src={item.thumbnail} alt={item.name} className="w-full h-24 object-cover rounded" />
               ) : (
-                <Icon className="w-16 h-16 text-gray-400" />
+                <Thumbnail
+                  src={item.thumbnail}
+                  alt={item.name}
+                  className="w-full h-24 object-cover rounded"
+                  fallback={<Icon className="w-16 h-16 text-gray-400" />}
+                />
               )}
               <div className="w-full text-center">
                 <p className="text-sm text-gray-900 truncate" title={item.name}>{item.name}</p>
@@ -10,15 +10,17 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from './ui/tabs';
 import { ScrollArea } from './ui/scroll-area';
 import { Avatar, AvatarFallback } from './ui/avatar';
 import { Textarea } from './ui/textarea';
+import Thumbnail from './Thumbnail';
 import { Download, Share2, Star, Trash2, X, ZoomIn, ZoomOut, FileText } from 'lucide-react';
 import { formatFileSize, formatDate } from '../utils/helpers';
 import { useToast } from '../hooks/use-toast';
 
-const FilePreviewModal = ({ isOpen, onClose, file, onAddComment, onAction, getComments }) => {
+const FilePreviewModal = ({ isOpen, onClose, file, onAddComment, onAction, getComments, getPreview }) => {
   const [newComment, setNewComment] = useState('');
   const [zoom, setZoom] = useState(100);
   const [comments, setComments] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [imageUrl, setImageUrl] = useState(null);
   const { toast } = useToast();
 
   useEffect(() => {
@@ -27,6 +29,20 @@ const FilePreviewModal = ({ isOpen, onClose, file, onAddComment, onAction, getCo
     }
   }, [isOpen, file]);
 
+  useEffect(() => {
+    setImageUrl(null);
+    if (!(isOpen && file?.type?.startsWith('image/') && file.thumbnail)) return undefined;
+    let cancelled = false;
+    getPreview(file.id).then((preview) => {
+      if (!cancelled && preview?.type === 'image') {
+        setImageUrl(preview.preview);
+      }
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, [isOpen, file]);
+
   const loadComments = async () => {
     setLoading(true);
     try {
@@ -53,11 +69,19 @@ const FilePreviewModal = ({ isOpen, onClose, file, onAddComment, onAction, getCo
     if (file.type?.startsWith('image/')) {
       return (
         <div className="flex items-center justify-center h-full bg-gray-900 p-4">
-          <img
-            src={file.thumbnail || 'https://via.placeholder.com/800x600?text=Image+Preview'}
+          <Thumbnail
+            src={imageUrl}
             alt={file.name}
             style={{ maxWidth: `${zoom}%`, maxHeight: '100%' }}
             className="object-contain"
+            fallback={
+              <img
+                src="https://via.placeholder.com/800x600?text=Image+Preview"
+                alt={file.name}
+                style={{ maxWidth: `${zoom}%`, maxHeight: '100%' }}
+                className="object-contain"
+              />
+            }
           />
         </div>
       );
@@ -0,0 +1,33 @@
+import React, { useState, useEffect } from 'react';
+import * as api from '../api/client';
+
+// Thumbnail URLs are backend paths that need the Authorization header, so
+// they cannot be used as <img src> directly. The image is fetched through
+// the API client instead; `fallback` shows until it loads, or if it fails.
+const Thumbnail = ({ src, alt, fallback = null, ...props }) => {
+  const [objectUrl, setObjectUrl] = useState(null);
+
+  useEffect(() => {
+    if (!src) return undefined;
+    let cancelled = false;
+    let url = null;
+    api.files.thumbnail(src)
+      .then((response) => {
+        if (cancelled) return;
+        url = URL.createObjectURL(response.data);
+        setObjectUrl(url);
+      })
+      .catch((error) => {
+        console.error('Error loading thumbnail:', error);
+      });
+    return () => {
+      cancelled = true;
+      setObjectUrl(null);
+      if (url) URL.revokeObjectURL(url);
+    };
+  }, [src]);
+
+  return objectUrl ? <img src={objectUrl} alt={alt} {...props} /> : fallback;
+};
+
+export default Thumbnail;
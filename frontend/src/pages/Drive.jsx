@@ -309,6 +309,16 @@ const Drive = ({ currentUser, onLogout }) => {
     }
   };
 
+  const getFilePreview = async (fileId) => {
+    try {
+      const response = await api.files.preview(fileId);
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching preview:', error);
+      return null;
+    }
+  };
+
   const getFileComments = async (fileId) => {
     try {
       const response = await api.comments.getComments(fileId);
@@ -401,6 +411,7 @@ const Drive = ({ currentUser, onLogout }) => {
         onAction={handleItemAction}
         onAddComment={handleAddComment}
         getComments={getFileComments}
+        getPreview={getFilePreview}
       />
     </div>
   );